@@ -0,0 +1,141 @@
+"""Write-behind buffer for ``study_groups.last_activity``.
+
+Posting a message, uploading a resource or creating an event only needs to
+move the group's ``last_activity`` forward, and a busy group does that many
+times a second. ``ActivityBuffer.record`` keeps just the newest timestamp per
+group in memory; a background task writes them every
+``ACTIVITY_FLUSH_SECONDS`` with one unordered ``bulk_write`` of ``$max``
+updates, so late or repeated flushes can never move a timestamp backwards.
+``ACTIVITY_MAX_PENDING`` groups waiting triggers an early flush, and the
+buffer is flushed on shutdown.
+
+The ``last_activity`` returned by the group endpoints may lag by up to one
+flush interval. ``ACTIVITY_FLUSH_SECONDS=0`` turns the buffer off and writes
+every bump straight through.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from .database import async_db
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FLUSH_SECONDS = float(os.getenv("ACTIVITY_FLUSH_SECONDS", 2))
+ACTIVITY_MAX_PENDING = int(os.getenv("ACTIVITY_MAX_PENDING", 5000))
+
+
+class ActivityBuffer:
+    def __init__(self, collection=None, interval: float = ACTIVITY_FLUSH_SECONDS, max_pending: int = ACTIVITY_MAX_PENDING):
+        self.collection = collection if collection is not None else async_db.study_groups
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._task = None
+        self._flush_now = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    async def record(self, group_id: str, when: datetime = None):
+        """Note activity in ``group_id`` (now, unless ``when`` is given)."""
+        when = when or datetime.now(timezone.utc)
+        self.recorded += 1
+        if self.interval <= 0:
+            await self.collection.update_one({"_id": ObjectId(group_id)}, {"$max": {"last_activity": when}})
+            self.written += 1
+            return
+        current = self._pending.get(group_id)
+        if current is None or when > current:
+            self._pending[group_id] = when
+        if len(self._pending) >= self.max_pending:
+            self._flush_now.set()
+
+    async def flush(self) -> int:
+        """Write every pending timestamp; returns how many groups were updated."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            invalid = [group_id for group_id in pending if not ObjectId.is_valid(group_id)]
+            for group_id in invalid:
+                del pending[group_id]
+                self.dropped += 1
+                logger.warning("Dropping activity update for invalid group id %r", group_id)
+            if not pending:
+                return 0
+            started = time.perf_counter()
+            try:
+                operations = [
+                    UpdateOne({"_id": ObjectId(group_id)}, {"$max": {"last_activity": when}})
+                    for group_id, when in pending.items()
+                ]
+                await self.collection.bulk_write(operations, ordered=False)
+            except Exception as error:
+                # Keep the timestamps for the next attempt, merged with newer ones
+                for group_id, when in pending.items():
+                    current = self._pending.get(group_id)
+                    if current is None or when > current:
+                        self._pending[group_id] = when
+                self.failures += 1
+                logger.warning("Could not flush %d activity updates: %s", len(pending), error)
+                return 0
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.written += len(operations)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return len(operations)
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "flush_interval_seconds": self.interval,
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "written": self.written,
+            "coalesced": self.recorded - self.written - self.dropped - len(self._pending),
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "mean_flush_ms": self._total_flush_ms / self.flushes if self.flushes else 0.0,
+        }
+
+
+activity_buffer = ActivityBuffer()
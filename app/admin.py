@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException
+from .database import async_db
+from .dependencies import get_admin_user, group_cache, user_cache
+from .analytics import ALL_INSTITUTIONS
+from .activity import activity_buffer
+from .broker import broker
+from .indexes import index_report
+from .ingest import message_ingest
+from .jobs import job_queue
+from .utils import password_hasher
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+def serialize_analytics(doc: dict) -> dict:
+    doc.pop("_id", None)
+    return doc
+
+@router.get("/analytics/cgpa")
+async def list_cgpa_analytics(user=Depends(get_admin_user)):
+    """Platform-wide CGPA distribution and the institutions that have analytics"""
+    overall = await async_db.cgpa_analytics.find_one({"_id": ALL_INSTITUTIONS})
+    if not overall:
+        raise HTTPException(status_code=404, detail="Analytics have not been generated yet")
+    institutions = await async_db.cgpa_analytics.distinct("_id", {"_id": {"$ne": ALL_INSTITUTIONS}})
+    overall = serialize_analytics(overall)
+    overall["institutions"] = sorted(institutions)
+    return overall
+
+@router.get("/analytics/cgpa/{institution}")
+async def get_cgpa_analytics(institution: str, user=Depends(get_admin_user)):
+    """Precomputed CGPA distribution and per-course grade histograms for one institution"""
+    doc = await async_db.cgpa_analytics.find_one({"_id": institution})
+    if not doc:
+        raise HTTPException(status_code=404, detail="No analytics for this institution")
+    return serialize_analytics(doc)
+
+@router.get("/metrics")
+async def get_metrics(user=Depends(get_admin_user)):
+    """In-process counters of this API process (caches, buffers, queues) and index drift"""
+    return {
+        "activity_buffer": activity_buffer.stats(),
+        "user_cache": user_cache.stats(),
+        "group_cache": group_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "broker": broker.stats(),
+        "message_ingest": message_ingest.stats(),
+        "jobs": await job_queue.stats(),
+        "indexes": await index_report(),
+    }
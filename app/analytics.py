@@ -0,0 +1,133 @@
+"""Cohort CGPA analytics, precomputed by a batch job.
+
+    python -m app.analytics [--batch-size 1000]
+
+Streams ``semesters`` with a cursor and flattens each course into a few
+columns. It then computes, grouped by the student's ``users.institution``:
+
+* the distribution of student CGPAs (mean, std, percentiles, histogram)
+* a grade histogram for every course
+
+The work is vectorized in pandas/NumPy. Results replace the documents in
+``cgpa_analytics``, one per institution plus ``ALL_INSTITUTIONS`` for the
+whole platform, so the admin endpoint serves them with a single read.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from .cgpa import GRADE_POINTS
+from .database import db
+
+ALL_INSTITUTIONS = "__all__"
+UNKNOWN_INSTITUTION = "Unknown"
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = np.linspace(0, max(GRADE_POINTS.values()), 11)
+# Keeps each institution document well under the 16 MB limit
+MAX_COURSES_PER_INSTITUTION = 500
+
+
+def load_institutions(database) -> dict:
+    institutions = {}
+    for user in database.users.find({}, {"institution": 1}):
+        name = (user.get("institution") or "").strip()
+        institutions[str(user["_id"])] = name or UNKNOWN_INSTITUTION
+    return institutions
+
+
+def load_courses(database, batch_size: int) -> pd.DataFrame:
+    """One row per semester course: user_id, course, grade, unit."""
+    user_ids, courses, grades, units = [], [], [], []
+    cursor = database.semesters.find(
+        {}, {"user_id": 1, "courses.name": 1, "courses.grade": 1, "courses.unit": 1}
+    ).batch_size(batch_size)
+    for sem in cursor:
+        for course in sem.get("courses") or []:
+            user_ids.append(sem.get("user_id"))
+            courses.append((course.get("name") or "").strip().upper())
+            grades.append((course.get("grade") or "F").strip().upper())
+            units.append(course.get("unit"))
+    frame = pd.DataFrame({"user_id": user_ids, "course": courses, "grade": grades, "unit": units})
+    frame["unit"] = pd.to_numeric(frame["unit"], errors="coerce").fillna(0).astype("int64")
+    frame["grade"] = frame["grade"].where(frame["grade"].isin(list(GRADE_POINTS)), "F")
+    frame["points"] = frame["grade"].map(GRADE_POINTS).astype("int64") * frame["unit"]
+    return frame
+
+
+def cgpa_distribution(cgpas: pd.Series) -> dict:
+    counts, _ = np.histogram(cgpas.to_numpy(), bins=HISTOGRAM_BINS)
+    values = np.percentile(cgpas.to_numpy(), PERCENTILES) if len(cgpas) else [0.0] * len(PERCENTILES)
+    return {
+        "students": int(len(cgpas)),
+        "mean": round(float(cgpas.mean()), 3) if len(cgpas) else 0.0,
+        "std": round(float(cgpas.std(ddof=0)), 3) if len(cgpas) else 0.0,
+        "percentiles": {f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, values)},
+        "histogram": {"bins": [round(float(b), 2) for b in HISTOGRAM_BINS], "counts": counts.tolist()},
+    }
+
+
+def course_histograms(frame: pd.DataFrame) -> list:
+    counts = frame.groupby(["course", "grade"]).size().unstack(fill_value=0)
+    counts = counts.reindex(columns=list(GRADE_POINTS), fill_value=0)
+    totals = counts.sum(axis=1).sort_values(ascending=False).head(MAX_COURSES_PER_INSTITUTION)
+    return [
+        {"course": course, "enrollments": int(total), "grades": {g: int(n) for g, n in counts.loc[course].items()}}
+        for course, total in totals.items()
+    ]
+
+
+def compute(frame: pd.DataFrame, institutions: dict) -> dict:
+    """Analytics documents keyed by institution (plus ``ALL_INSTITUTIONS``)."""
+    frame = frame.assign(institution=frame["user_id"].map(institutions).fillna(UNKNOWN_INSTITUTION))
+    graded = frame[frame["unit"] > 0]
+
+    per_student = graded.groupby(["institution", "user_id"])[["points", "unit"]].sum()
+    per_student["cgpa"] = per_student["points"] / per_student["unit"]
+
+    results = {ALL_INSTITUTIONS: {
+        "cgpa": cgpa_distribution(per_student["cgpa"]),
+        "courses": course_histograms(graded),
+    }}
+    for institution, students in per_student.groupby(level="institution"):
+        results[institution] = {
+            "cgpa": cgpa_distribution(students["cgpa"]),
+            "courses": course_histograms(graded[graded["institution"] == institution]),
+        }
+    return results
+
+
+def run(database=db, batch_size: int = 1000) -> dict:
+    started = time.perf_counter()
+    institutions = load_institutions(database)
+    frame = load_courses(database, batch_size)
+    results = compute(frame, institutions)
+
+    generated_at = datetime.now(timezone.utc)
+    for institution, doc in results.items():
+        database.cgpa_analytics.replace_one(
+            {"_id": institution},
+            {"_id": institution, "institution": institution, "generated_at": generated_at, **doc},
+            upsert=True,
+        )
+    # Institutions that no longer have any graded students
+    database.cgpa_analytics.delete_many({"generated_at": {"$lt": generated_at}})
+    return {
+        "institutions": len(results) - 1,
+        "course_rows": len(frame),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute cohort CGPA analytics")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    report = run(batch_size=args.batch_size)
+    print(", ".join(f"{key}: {value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,54 @@
 from fastapi import APIRouter, HTTPException
 from . import schemas, utils
-from .database import db
+from .database import async_db
 from .token import create_access_token
+from .dependencies import invalidate_cached_user
 from datetime import timedelta
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+def busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in attempts right now. Please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/signup", response_model=schemas.UserResponse)
-def signup(user: schemas.UserCreate):
-    if db.users.find_one({"email": user.email}):
+async def signup(user: schemas.UserCreate):
+    if await async_db.users.find_one({"email": user.email}):
         raise HTTPException(status_code=400, detail="Email already registered.")
-    if db.users.find_one({"username": user.username}):
+    if await async_db.users.find_one({"username": user.username}):
         raise HTTPException(status_code=400, detail="Username already taken.")
-    hashed_pw = utils.hash_password(user.password)
+    try:
+        hashed_pw = await utils.password_hasher.hash(user.password)
+    except utils.PasswordPoolBusy:
+        raise busy_error()
     user_doc = user.dict()
     user_doc["hashed_password"] = hashed_pw
     del user_doc["password"]
-    result = db.users.insert_one(user_doc)
+    try:
+        result = await async_db.users.insert_one(user_doc)
+    except DuplicateKeyError as error:
+        # A concurrent signup took the email or username after the checks above
+        if "username" in (error.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=400, detail="Username already taken.")
+        raise HTTPException(status_code=400, detail="Email already registered.")
+    invalidate_cached_user(user_doc["email"])
     user_doc["_id"] = str(result.inserted_id)
     return schemas.UserResponse(**user_doc)
 
 @router.post("/login")
-def login(user: schemas.UserLogin):
-    existing_user = db.users.find_one({"email": user.email})
-    if not existing_user or not utils.verify_password(user.password, existing_user["hashed_password"]):
+async def login(user: schemas.UserLogin):
+    existing_user = await async_db.users.find_one({"email": user.email})
+    try:
+        valid = bool(existing_user) and await utils.password_hasher.verify(
+            user.password, existing_user["hashed_password"]
+        )
+    except utils.PasswordPoolBusy:
+        raise busy_error()
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid email or password.")
     access_token_expires = timedelta(minutes=1440)
     access_token = create_access_token(
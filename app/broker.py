@@ -0,0 +1,190 @@
+"""Pub/sub for real-time discussion delivery.
+
+``create_discussion_message`` publishes every new message to the group's
+channel and each open WebSocket holds a ``Subscription`` on it. Two
+brokers are available, selected with ``DISCUSSION_BROKER``:
+
+* ``inprocess`` (default) fans out within this process only.
+* ``changestream`` tails a MongoDB change stream on ``discussion_messages``,
+  so every API process sees every insert (requires a replica set).
+
+Publishing never waits on subscribers. Each subscription has a bounded
+queue; a consumer that falls ``SUBSCRIBER_QUEUE_SIZE`` messages behind is
+either disconnected (``disconnect``, the default, the client then catches
+up through ``GET .../discussions?after=``) or loses its oldest messages
+(``drop_oldest``).
+"""
+import asyncio
+import logging
+import os
+from fastapi.encoders import jsonable_encoder
+from .database import async_db
+
+logger = logging.getLogger(__name__)
+
+DISCUSSION_BROKER = os.getenv("DISCUSSION_BROKER", "inprocess")
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", 100))
+SLOW_CONSUMER_POLICY = os.getenv("SLOW_CONSUMER_POLICY", "disconnect")
+
+
+class SubscriptionClosed(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Subscription:
+    def __init__(self, broker, channel: str, maxsize: int, policy: str):
+        self.broker = broker
+        self.channel = channel
+        self.policy = policy
+        self.dropped = 0
+        self.close_reason = None
+        self._queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, message):
+        """Queue ``message`` without blocking, applying the slow-consumer policy."""
+        if self.close_reason:
+            return
+        if self._queue.full():
+            if self.policy == "drop_oldest":
+                self._queue.get_nowait()
+                self.dropped += 1
+            else:
+                self.close("slow consumer")
+                return
+        self._queue.put_nowait(message)
+
+    async def get(self):
+        if self.close_reason and self._queue.empty():
+            raise SubscriptionClosed(self.close_reason)
+        message = await self._queue.get()
+        if message is _CLOSED:
+            raise SubscriptionClosed(self.close_reason)
+        return message
+
+    def close(self, reason: str = "closed"):
+        if self.close_reason:
+            return
+        self.close_reason = reason
+        self.broker.unsubscribe(self)
+        # Wake a pending get(); make room if the queue is full
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(_CLOSED)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+_CLOSED = object()
+
+
+class InProcessBroker:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE, policy: str = SLOW_CONSUMER_POLICY):
+        if policy not in ("disconnect", "drop_oldest"):
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self._channels = {}
+        self.published = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        for channel in list(self._channels):
+            self.close_channel(channel, "server shutting down")
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel, self.queue_size, self.policy)
+        self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._channels.get(subscription.channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._channels[subscription.channel]
+
+    def close_channel(self, channel: str, reason: str = "channel closed"):
+        for subscription in list(self._channels.get(channel, ())):
+            subscription.close(reason)
+
+    def fan_out(self, channel: str, message):
+        self.published += 1
+        for subscription in list(self._channels.get(channel, ())):
+            subscription.offer(message)
+
+    async def publish(self, channel: str, message):
+        self.fan_out(channel, message)
+
+    def stats(self) -> dict:
+        return {
+            "broker": type(self).__name__,
+            "channels": len(self._channels),
+            "subscribers": sum(len(s) for s in self._channels.values()),
+            "published": self.published,
+        }
+
+
+class ChangeStreamBroker(InProcessBroker):
+    """Delivers messages from a change stream instead of from ``publish``.
+
+    The insert into ``discussion_messages`` is the publish, so ``publish`` is
+    a no-op and every process fans out the inserts it sees to its own sockets.
+    """
+
+    RETRY_DELAY_SECONDS = 1.0
+
+    def __init__(self, collection=None, serialize=None, **kwargs):
+        super().__init__(**kwargs)
+        self.collection = collection if collection is not None else async_db.discussion_messages
+        self.serialize = serialize or jsonable_encoder
+        self._task = None
+        self._resume_token = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await super().stop()
+
+    async def publish(self, channel: str, message):
+        pass
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=self._resume_token) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        doc = change["fullDocument"]
+                        doc["_id"] = str(doc["_id"])
+                        self.fan_out(doc["group_id"], self.serialize(doc))
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("Discussion change stream failed, retrying: %s", error)
+                await asyncio.sleep(self.RETRY_DELAY_SECONDS)
+
+
+def create_broker(kind: str = DISCUSSION_BROKER):
+    if kind == "inprocess":
+        return InProcessBroker()
+    if kind == "changestream":
+        return ChangeStreamBroker()
+    raise ValueError(f"Unknown DISCUSSION_BROKER: {kind}")
+
+
+broker = create_broker()
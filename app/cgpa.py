@@ -0,0 +1,225 @@
+"""Materialized CGPA summaries.
+
+Every user has one document in ``cgpa_summaries`` holding running totals,
+so the dashboard can read its CGPA in O(1) instead of reloading every
+semester:
+
+    {
+        "_id": <user_id>,
+        "total_points": 87, "total_units": 20, "semester_count": 2,
+        "semesters": {"<semester_id>": {"name": "...", "points": 40, "units": 9}, ...}
+    }
+
+The semester routes apply their changes as atomic ``$inc`` deltas. Totals
+can drift if a process dies between the semester write and the summary
+write. ``python -m app.cgpa verify`` compares every summary against a full
+recompute, and ``rebuild`` (or ``verify --fix``) rewrites them.
+"""
+import argparse
+import asyncio
+import sys
+
+from .database import async_db
+
+GRADE_POINTS = {"A": 5, "B": 4, "C": 3, "D": 2, "E": 1, "F": 0}
+
+
+def grade_point(grade) -> int:
+    return GRADE_POINTS.get((grade or "F").upper(), 0)
+
+
+def course_totals(course: dict) -> tuple:
+    """(quality points, units) contributed by one semester course."""
+    try:
+        unit = int(course.get("unit") or 0)
+    except (TypeError, ValueError):
+        unit = 0
+    return grade_point(course.get("grade")) * unit, unit
+
+
+def semester_totals(courses: list) -> tuple:
+    points = units = 0
+    for course in courses or []:
+        course_points, course_units = course_totals(course)
+        points += course_points
+        units += course_units
+    return points, units
+
+
+def gpa(points, units) -> float:
+    return (points / units) if units else 0.0
+
+
+async def _update_or_rebuild(user_id: str, update: dict):
+    # No summary yet (e.g. a user from before summaries existed): the semester
+    # write has already happened, so a full recompute includes this change
+    result = await async_db.cgpa_summaries.update_one({"_id": user_id}, update)
+    if result.matched_count == 0:
+        await rebuild_summary(user_id)
+
+
+async def record_semester(user_id: str, semester_id: str, name: str, order=None):
+    await _update_or_rebuild(user_id, {
+        "$inc": {"semester_count": 1},
+        "$set": {f"semesters.{semester_id}": {"name": name, "order": order, "points": 0, "units": 0}},
+    })
+
+
+async def apply_course_delta(user_id: str, semester_id: str, points: int, units: int):
+    if not points and not units:
+        return
+    await _update_or_rebuild(user_id, {"$inc": {
+        "total_points": points,
+        "total_units": units,
+        f"semesters.{semester_id}.points": points,
+        f"semesters.{semester_id}.units": units,
+    }})
+
+
+async def compute_summary(user_id: str) -> dict:
+    """Recompute a user's summary from their semesters."""
+    summary = {"_id": user_id, "total_points": 0, "total_units": 0, "semester_count": 0, "semesters": {}}
+    async for sem in async_db.semesters.find(
+        {"user_id": user_id}, {"name": 1, "order": 1, "courses.grade": 1, "courses.unit": 1}
+    ):
+        points, units = semester_totals(sem.get("courses"))
+        summary["semesters"][str(sem["_id"])] = {
+            "name": sem.get("name"), "order": sem.get("order"), "points": points, "units": units,
+        }
+        summary["total_points"] += points
+        summary["total_units"] += units
+        summary["semester_count"] += 1
+    return summary
+
+
+async def rebuild_summary(user_id: str) -> dict:
+    summary = await compute_summary(user_id)
+    await async_db.cgpa_summaries.replace_one({"_id": user_id}, summary, upsert=True)
+    return summary
+
+
+async def get_summary(user_id: str) -> dict:
+    """Read a user's summary, building it on first use."""
+    summary = await async_db.cgpa_summaries.find_one({"_id": user_id})
+    if summary is None:
+        summary = await rebuild_summary(user_id)
+    return summary
+
+
+def ordered_semesters(summary: dict) -> list:
+    """``(semester_id, entry)`` pairs in chronological order.
+
+    Semesters sort by their explicit ``order`` and then by creation time
+    (ObjectId order), with unordered semesters first, the same as MongoDB
+    sorts ``{"order": 1, "_id": 1}``.
+    """
+    return sorted(
+        (summary.get("semesters") or {}).items(),
+        key=lambda item: (item[1].get("order") is not None, item[1].get("order") or 0, item[0]),
+    )
+
+
+def semester_change(summary: dict) -> float:
+    """GPA of the latest graded semester minus the one before it."""
+    gpas = [gpa(sem["points"], sem["units"]) for _, sem in ordered_semesters(summary) if sem.get("units")]
+    return gpas[-1] - gpas[-2] if len(gpas) >= 2 else 0.0
+
+
+# Grade letter -> points, evaluated inside the aggregation pipeline
+_GRADE_POINT_EXPR = {"$switch": {
+    "branches": [
+        {"case": {"$eq": [{"$toUpper": {"$ifNull": ["$courses.grade", "F"]}}, grade]}, "then": points}
+        for grade, points in GRADE_POINTS.items()
+    ],
+    "default": 0,
+}}
+_UNIT_EXPR = {"$convert": {"input": "$courses.unit", "to": "int", "onError": 0, "onNull": 0}}
+
+
+def history_pipeline(user_id: str) -> list:
+    """Per-semester GPA and running CGPA for one user, in chronological order."""
+    semester_order = {"order": 1, "_id": 1}
+    running = {"documents": ["unbounded", "current"]}
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$unwind": {"path": "$courses", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": "$_id",
+            "name": {"$first": "$name"},
+            "order": {"$first": "$order"},
+            "points": {"$sum": {"$multiply": [_GRADE_POINT_EXPR, _UNIT_EXPR]}},
+            "units": {"$sum": _UNIT_EXPR},
+        }},
+        {"$sort": semester_order},
+        {"$setWindowFields": {
+            "sortBy": semester_order,
+            "output": {
+                "cumulative_points": {"$sum": "$points", "window": running},
+                "cumulative_units": {"$sum": "$units", "window": running},
+            },
+        }},
+        {"$project": {
+            "_id": 0,
+            "semester_id": {"$toString": "$_id"},
+            "name": 1,
+            "order": 1,
+            "units": 1,
+            "cumulative_units": 1,
+            "gpa": {"$cond": [{"$gt": ["$units", 0]}, {"$round": [{"$divide": ["$points", "$units"]}, 2]}, 0]},
+            "cgpa": {"$cond": [
+                {"$gt": ["$cumulative_units", 0]},
+                {"$round": [{"$divide": ["$cumulative_points", "$cumulative_units"]}, 2]},
+                0,
+            ]},
+        }},
+    ]
+
+
+async def gpa_history(user_id: str) -> list:
+    return await async_db.semesters.aggregate(history_pipeline(user_id)).to_list(length=None)
+
+
+def _comparable(summary: dict) -> dict:
+    return {
+        "total_points": summary.get("total_points", 0),
+        "total_units": summary.get("total_units", 0),
+        "semester_count": summary.get("semester_count", 0),
+        "semesters": {
+            sem_id: (sem.get("points", 0), sem.get("units", 0))
+            for sem_id, sem in (summary.get("semesters") or {}).items()
+        },
+    }
+
+
+async def verify(fix: bool = False, user_ids=None) -> list:
+    """Return the user ids whose stored summary differs from a full recompute."""
+    if user_ids is None:
+        user_ids = await async_db.semesters.distinct("user_id")
+    mismatched = []
+    for user_id in user_ids:
+        expected = await compute_summary(user_id)
+        stored = await async_db.cgpa_summaries.find_one({"_id": user_id}) or {}
+        if _comparable(stored) != _comparable(expected):
+            mismatched.append(user_id)
+            if fix:
+                await async_db.cgpa_summaries.replace_one({"_id": user_id}, expected, upsert=True)
+    return mismatched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or rebuild materialized CGPA summaries")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user", action="append", help="only check this user id (repeatable)")
+    parser.add_argument("--fix", action="store_true", help="with verify: rewrite mismatched summaries")
+    args = parser.parse_args(argv)
+
+    fix = args.fix or args.command == "rebuild"
+    mismatched = asyncio.run(verify(fix=fix, user_ids=args.user))
+    for user_id in mismatched:
+        print(f"{'rebuilt' if fix else 'mismatch'}: {user_id}")
+    print(f"{len(mismatched)} summaries {'rebuilt' if fix else 'out of date'}.")
+    return 1 if mismatched and not fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,17 @@
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
+from .dbstats import command_counter
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["edudash_db"]
\ No newline at end of file
+DB_NAME = "edudash_db"
+
+# Blocking client, kept for scripts and one-off maintenance commands
+client = MongoClient(MONGO_URI, event_listeners=[command_counter])
+db = client[DB_NAME]
+
+# Non-blocking client used by the API routers
+async_client = AsyncIOMotorClient(MONGO_URI, event_listeners=[command_counter])
+async_db = async_client[DB_NAME]
@@ -0,0 +1,66 @@
+"""Per-request count of MongoDB commands.
+
+A pymongo command listener bumps a counter held in a context variable. The HTTP
+middleware in ``main`` installs a fresh counter for every request and reports it
+in the ``X-DB-Calls`` response header. Motor runs pymongo calls on its executor
+with a copy of the caller's context, so the counter object is shared with the
+request that issued the command.
+
+Headers are sent before the body, so ``X-DB-Calls`` only covers the commands
+issued until the response started. Commands made while a streamed body is
+produced (GridFS chunk reads of a download) are not in the header; once such a
+body finishes, ``count_body`` logs the request's full total instead.
+"""
+import contextvars
+import logging
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DB_CALLS_HEADER = "X-DB-Calls"
+
+_request_counter = contextvars.ContextVar("db_call_counter", default=None)
+
+
+class CallCounter:
+    __slots__ = ("calls",)
+
+    def __init__(self):
+        self.calls = 0
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent on behalf of the current request (if one is being tracked)."""
+
+    def started(self, event):
+        counter = _request_counter.get()
+        if counter is not None:
+            counter.calls += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+command_counter = CommandCounter()
+
+
+def track_request() -> CallCounter:
+    """Start counting commands for the current context; returns the live counter."""
+    counter = CallCounter()
+    _request_counter.set(counter)
+    return counter
+
+
+async def count_body(body_iterator, counter: CallCounter, label: str):
+    """Pass ``body_iterator`` through, then log the commands it issued, if any."""
+    before = counter.calls
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        streamed = counter.calls - before
+        if streamed:
+            logger.info("%s: %d DB calls (%d after the headers were sent)", label, counter.calls, streamed)
@@ -1,16 +1,112 @@
-from fastapi import Depends, HTTPException, Request
+import os
+from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
+from bson import ObjectId
 from .token import verify_access_token
-from .database import db
+from .database import async_db
+from .cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+
+GROUP_CACHE_SIZE = int(os.getenv("GROUP_CACHE_SIZE", 10000))
+GROUP_CACHE_TTL_SECONDS = float(os.getenv("GROUP_CACHE_TTL_SECONDS", 30))
+
+# User documents keyed by the token ``sub`` (the user's email)
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+# Study group access data: the access fields of a group keyed by its id, and a
+# caller's role keyed by ``(group_id, user_id)`` ("" for non-members). The cache is
+# per process, so other workers may see a join or leave up to the TTL late.
+group_cache = TTLCache(maxsize=GROUP_CACHE_SIZE, ttl=GROUP_CACHE_TTL_SECONDS)
+GROUP_ACCESS_PROJECTION = {"is_private": 1, "creator_id": 1, "is_active": 1}
+
+
+def invalidate_cached_user(email: str):
+    """Drop a cached user. Call this after any write to that user's document."""
+    user_cache.invalidate(email)
+
+
+def invalidate_cached_group(group_id: str, user_id: str = None):
+    """Drop cached group access data.
+
+    Pass ``user_id`` after that user joins or leaves; omit it when the group
+    itself changed or was deleted.
+    """
+    group_cache.invalidate(group_id if user_id is None else (group_id, user_id))
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await load_user_from_token(token)
+
+
+async def load_user_from_token(token: str):
+    """Resolve a bearer token to its user; shared by HTTP and WebSocket routes."""
     payload = verify_access_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token.")
-    user = db.users.find_one({"email": payload["sub"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    user["_id"] = str(user["_id"])
+    email = payload["sub"]
+    user = user_cache.get(email)
+    if user is None:
+        user = await async_db.users.find_one({"email": email})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found.")
+        user["_id"] = str(user["_id"])
+        user_cache.set(email, user)
+    # Handlers get their own copy so they cannot mutate the cached document
+    return dict(user)
+
+
+async def get_admin_user(user=Depends(get_current_user)):
+    if not user.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required.")
     return user
+
+
+async def resolve_group_access(group_id: str, user_id: str) -> dict:
+    """Look up a study group and the caller's role in it, through ``group_cache``.
+
+    Returns ``{"group_id", "user_id", "is_private", "creator_id", "role",
+    "is_member"}`` (``role`` is None for non-members). Raises 400 for a malformed
+    id and 404 for a missing group.
+    """
+    if not ObjectId.is_valid(group_id):
+        raise HTTPException(status_code=400, detail="Invalid group ID")
+    group = group_cache.get(group_id)
+    if group is None:
+        group = await async_db.study_groups.find_one({"_id": ObjectId(group_id)}, GROUP_ACCESS_PROJECTION)
+        if not group:
+            raise HTTPException(status_code=404, detail="Study group not found")
+        group_cache.set(group_id, group)
+    # Deleted groups linger with is_active = False until their cleanup job runs
+    if group.get("is_active") is False:
+        raise HTTPException(status_code=404, detail="Study group not found")
+
+    role = group_cache.get((group_id, user_id))
+    if role is None:
+        record = await async_db.group_members.find_one({"group_id": group_id, "user_id": user_id}, {"role": 1})
+        role = record.get("role", "member") if record else ""
+        group_cache.set((group_id, user_id), role)
+
+    return {
+        "group_id": group_id,
+        "user_id": user_id,
+        "is_private": group.get("is_private", False),
+        "creator_id": group.get("creator_id"),
+        "role": role or None,
+        "is_member": bool(role),
+    }
+
+
+async def get_group_access(group_id: str, user=Depends(get_current_user)) -> dict:
+    """The study group named in the path, with the caller's role in it."""
+    return await resolve_group_access(group_id, str(user["_id"]))
+
+
+async def get_readable_group(access=Depends(get_group_access)) -> dict:
+    """Like ``get_group_access``, but private groups are refused to non-members."""
+    if access["is_private"] and not access["is_member"]:
+        raise HTTPException(status_code=403, detail="Access denied to private group")
+    return access
@@ -0,0 +1,204 @@
+"""Index registry for every collection the API queries.
+
+Indexes are declared once in ``INDEXES`` and applied on startup (see
+``main.lifespan``) or from the command line:
+
+    python -m app.indexes apply   # create anything that is missing
+    python -m app.indexes check   # report drift, exit 1 if there is any
+
+Unique indexes are required: the API relies on them for correctness (e.g.
+``DuplicateKeyError`` is what stops a double join), so startup fails with
+``RequiredIndexesMissing`` if one of them is missing or built differently.
+Other drift only costs performance; it is logged and reported by
+``GET /admin/metrics``.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from .database import async_db
+
+logger = logging.getLogger(__name__)
+
+
+class RequiredIndexesMissing(RuntimeError):
+    """A unique index the API depends on could not be built."""
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "courses": [
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+    "semesters": [
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("courses._id", ASCENDING)], name="courses_id"),
+    ],
+    "study_blocks": [
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING), ("startTime", ASCENDING)], name="user_day_start"),
+    ],
+    "study_groups": [
+        IndexModel(
+            [("access_code", ASCENDING)],
+            name="access_code_unique",
+            unique=True,
+            # Public groups store access_code = None; only real codes must be unique
+            partialFilterExpression={"access_code": {"$type": "string"}},
+        ),
+        # One index per $or branch of the group listing, each ending in its sort keys
+        IndexModel(
+            [("is_private", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="is_private_created_at",
+        ),
+        IndexModel(
+            [("is_private", ASCENDING), ("course", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="is_private_course_created_at",
+        ),
+    ],
+    "group_members": [
+        # group_members is the source of truth for membership; one record per pair.
+        # New name: the old non-unique "group_user" index on the same keys would
+        # otherwise conflict with it (see app.migrations.membership_collection)
+        IndexModel([("group_id", ASCENDING), ("user_id", ASCENDING)], name="group_user_unique", unique=True),
+        IndexModel([("group_id", ASCENDING), ("_id", ASCENDING)], name="group_id_page"),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+    "discussion_messages": [
+        IndexModel(
+            [("group_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="group_created_at_id",
+        ),
+    ],
+    "group_resources": [
+        IndexModel([("group_id", ASCENDING), ("uploaded_at", DESCENDING)], name="group_uploaded_at"),
+    ],
+    "resource_files.files": [
+        IndexModel([("metadata.group_id", ASCENDING)], name="metadata_group_id"),
+    ],
+    "group_timetable_events": [
+        IndexModel([("group_id", ASCENDING), ("start_time", ASCENDING)], name="group_start_time"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        # Completed jobs expire after a week; failed ones stay until inspected
+        IndexModel(
+            [("finished_at", ASCENDING)],
+            name="finished_at_ttl",
+            expireAfterSeconds=7 * 24 * 3600,
+            partialFilterExpression={"status": "done"},
+        ),
+    ],
+}
+
+# Options that change how an index behaves; anything else (v, ns, ...) is ignored
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _signature(spec: dict) -> dict:
+    signature = {"key": list(dict(spec["key"]).items())}
+    for option in _COMPARED_OPTIONS:
+        if spec.get(option) is not None:
+            signature[option] = spec[option]
+    return signature
+
+
+async def index_drift(database=async_db) -> dict:
+    """Compare ``INDEXES`` with what exists in ``database``.
+
+    Returns ``{collection: {"missing": [...], "changed": [...], "extra": [...]}}``
+    containing only collections that have drifted.
+    """
+    drift = {}
+    for collection, models in INDEXES.items():
+        existing = await database[collection].index_information()
+        existing.pop("_id_", None)
+        expected = {model.document["name"]: model.document for model in models}
+
+        missing = [name for name in expected if name not in existing]
+        changed = [
+            name for name in expected
+            if name in existing
+            and _signature(expected[name]) != _signature(existing[name])
+        ]
+        extra = [name for name in existing if name not in expected]
+        if missing or changed or extra:
+            drift[collection] = {"missing": missing, "changed": changed, "extra": extra}
+    return drift
+
+
+def required_drift(drift: dict) -> list:
+    """``collection.name`` of every unique index that is missing or changed in ``drift``."""
+    required = []
+    for collection, report in drift.items():
+        unique = {model.document["name"] for model in INDEXES[collection] if model.document.get("unique")}
+        required.extend(
+            f"{collection}.{name}" for name in report["missing"] + report["changed"] if name in unique
+        )
+    return required
+
+
+async def ensure_indexes(database=async_db) -> dict:
+    """Create every registered index and return the drift that remains.
+
+    Each collection is created independently, so one failure (e.g. duplicate
+    data blocking a unique index) does not stop the others. Remaining drift is
+    logged; if it includes a required (unique) index, ``RequiredIndexesMissing``
+    is raised.
+    """
+    for collection, models in INDEXES.items():
+        try:
+            await database[collection].create_indexes(models)
+        except OperationFailure as error:
+            logger.error("Could not create indexes on %s: %s", collection, error)
+    drift = await index_drift(database)
+    for collection, report in drift.items():
+        logger.warning("Index drift on %s: %s", collection, report)
+    required = required_drift(drift)
+    if required:
+        raise RequiredIndexesMissing(
+            "Required unique indexes are missing or differ: " + ", ".join(required)
+            + " (fix the data, then run python -m app.indexes apply)"
+        )
+    return drift
+
+
+async def index_report(database=async_db) -> dict:
+    """Current drift plus the required indexes it affects, for ``/admin/metrics``."""
+    drift = await index_drift(database)
+    return {"drift": drift, "required_missing": required_drift(drift)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "check"])
+    args = parser.parse_args(argv)
+
+    if args.command == "apply":
+        try:
+            drift = asyncio.run(ensure_indexes())
+        except RequiredIndexesMissing as error:
+            print(error)
+            drift = asyncio.run(index_drift())
+    else:
+        drift = asyncio.run(index_drift())
+
+    if not drift:
+        print("Indexes match the registry.")
+        return 0
+    for collection, report in drift.items():
+        for kind in ("missing", "changed", "extra"):
+            for name in report[kind]:
+                print(f"{collection}: {kind} index {name}")
+    # Extra indexes are reported but are not an error on their own
+    return 1 if any(r["missing"] or r["changed"] for r in drift.values()) else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
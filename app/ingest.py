@@ -0,0 +1,240 @@
+"""Batched ingest for discussion messages.
+
+With ``DISCUSSION_INGEST=batched`` new messages are not inserted by the
+request that posts them. They go onto a bounded asyncio queue and a single
+writer task persists them with ``insert_many`` in micro-batches of up to
+``INGEST_BATCH_SIZE`` messages. A batch is written as soon as it is full or
+``INGEST_MAX_DELAY_MS`` after its first message arrived, whichever comes
+first, so no message waits longer than that before its write starts.
+
+Posters choose the acknowledgement:
+
+* ``persisted`` (default) - the request waits until its batch is written, so
+  the response still means "stored"; it just shares the write with others.
+* ``accepted`` - the request returns 202 as soon as the message is queued.
+  A message that then fails to persist after ``INGEST_MAX_RETRIES`` retries
+  is logged and counted as dropped.
+
+When the queue is full, or the writer is not running (before ``start``,
+after ``stop``), ``submit`` raises ``IngestBusy`` instead of letting memory
+grow or queueing a message nothing will write. Hooks registered with ``after_persist`` run for every written
+batch (fan-out to WebSockets, activity bumps), so subscribers only ever see
+stored messages. On shutdown the queue is drained before the writer stops.
+``DISCUSSION_INGEST=direct`` (the default) keeps the one-insert-per-request
+path, where every message is stored before the response. The acknowledgement
+actually given is echoed in the ``X-Message-Ack`` response header.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from pymongo.errors import BulkWriteError
+
+from .database import async_db
+
+logger = logging.getLogger(__name__)
+
+DISCUSSION_INGEST = os.getenv("DISCUSSION_INGEST", "direct")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 200))
+INGEST_MAX_DELAY_MS = float(os.getenv("INGEST_MAX_DELAY_MS", 20))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", 3))
+
+ACK_ACCEPTED = "accepted"
+ACK_PERSISTED = "persisted"
+ACK_HEADER = "X-Message-Ack"
+
+
+class IngestBusy(Exception):
+    """The ingest queue is full or not running; the caller should retry shortly."""
+
+
+class IngestFailed(Exception):
+    """A message could not be persisted."""
+
+
+class MessageIngest:
+    RETRY_DELAY_SECONDS = 0.2
+
+    def __init__(
+        self,
+        collection=None,
+        enabled: bool = DISCUSSION_INGEST == "batched",
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_delay_ms: float = INGEST_MAX_DELAY_MS,
+        queue_size: int = INGEST_QUEUE_SIZE,
+    ):
+        self.collection = collection if collection is not None else async_db.discussion_messages
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self._queue = None
+        self._task = None
+        self._hooks = []
+        self._settled = None
+        self.accepted = 0
+        self.persisted = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self._total_batch_ms = 0.0
+
+    def after_persist(self, hook):
+        """Decorator registering ``async def hook(docs)``, run after each written batch."""
+        self._hooks.append(hook)
+        return hook
+
+    async def submit(self, doc: dict, ack: str = ACK_PERSISTED):
+        """Queue ``doc`` for insertion; with ``persisted`` ack, wait until it is stored."""
+        if self._queue is None:
+            self.rejected += 1
+            raise IngestBusy()
+        future = asyncio.get_running_loop().create_future() if ack == ACK_PERSISTED else None
+        try:
+            self._queue.put_nowait((doc, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestBusy()
+        self.accepted += 1
+        if future is not None:
+            await future
+
+    async def start(self):
+        if self.enabled:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run(self._queue))
+
+    async def stop(self):
+        if not self._task:
+            return
+        # Let the writer drain what is already queued, then stop it. New
+        # submissions are refused from here on rather than left in the queue
+        queue, self._queue = self._queue, None
+        await queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _next_batch(self, queue: asyncio.Queue) -> list:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self.write(batch)
+            except Exception as error:
+                logger.error("Message ingest batch failed: %s", error)
+                self._abandon(batch, error)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def write(self, batch: list):
+        """Insert one batch, retrying transient failures, and settle its futures."""
+        docs = [doc for doc, _ in batch]
+        # Every message counts as failed until an insert attempt says otherwise
+        failed = {index: "not written" for index in range(len(docs))}
+        started = time.perf_counter()
+        try:
+            for attempt in range(INGEST_MAX_RETRIES + 1):
+                try:
+                    await self.collection.insert_many(docs, ordered=False)
+                    failed = {}
+                    break
+                except BulkWriteError as error:
+                    # Some documents made it; the rest failed for a reason a retry will not fix.
+                    # On a retry, a duplicate key means the earlier attempt already stored it.
+                    failed = {
+                        e["index"]: e.get("errmsg", "write error")
+                        for e in error.details.get("writeErrors", [])
+                        if not (attempt and e.get("code") == 11000)
+                    }
+                    break
+                except Exception as error:
+                    failed = {index: str(error) for index in range(len(docs))}
+                    if attempt < INGEST_MAX_RETRIES:
+                        logger.warning("Message ingest insert failed, retrying: %s", error)
+                        await asyncio.sleep(self.RETRY_DELAY_SECONDS * 2 ** attempt)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.last_batch_ms = elapsed_ms
+            self._total_batch_ms += elapsed_ms
+        finally:
+            # Settle even if the code above raised, so no poster waits forever
+            stored = self._settle(batch, failed)
+
+        for hook in self._hooks:
+            try:
+                await hook(stored)
+            except Exception as error:
+                logger.warning("Message ingest hook %s failed: %s", getattr(hook, "__name__", hook), error)
+
+    def _settle(self, batch: list, failed: dict) -> list:
+        """Resolve the futures of ``batch``; returns the documents that were stored."""
+        self._settled = None
+        stored = []
+        for index, (doc, future) in enumerate(batch):
+            if index in failed:
+                if future is None:
+                    self.dropped += 1
+                    logger.error("Dropped accepted message %s: %s", doc.get("_id"), failed[index])
+                elif not future.done():
+                    future.set_exception(IngestFailed(failed[index]))
+            else:
+                stored.append(doc)
+                if future is not None and not future.done():
+                    future.set_result(None)
+        self.persisted += len(stored)
+        self._settled = batch
+        return stored
+
+    def _abandon(self, batch: list, error: Exception):
+        """Fail whatever ``write`` left unsettled in ``batch``."""
+        if self._settled is batch:
+            return
+        for doc, future in batch:
+            if future is None:
+                self.dropped += 1
+                logger.error("Dropped accepted message %s: %s", doc.get("_id"), error)
+            elif not future.done():
+                future.set_exception(IngestFailed(str(error)))
+
+    def stats(self) -> dict:
+        return {
+            "mode": "batched" if self.enabled else "direct",
+            "queued": self._queue.qsize() if self._queue else 0,
+            "accepted": self.accepted,
+            "persisted": self.persisted,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": self.persisted / self.batches if self.batches else 0.0,
+            "last_batch_ms": self.last_batch_ms,
+            "mean_batch_ms": self._total_batch_ms / self.batches if self.batches else 0.0,
+        }
+
+
+message_ingest = MessageIngest()
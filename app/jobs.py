@@ -0,0 +1,216 @@
+"""Background jobs persisted in the ``jobs`` collection.
+
+Request handlers ``enqueue`` work that is too slow to do inline (cascade
+deletes, storage cleanup) and return; worker tasks started in
+``main.lifespan`` claim and run it. Because the queue lives in MongoDB,
+jobs survive restarts and every API process can work on them: a job is
+claimed with one ``find_one_and_update`` that takes a lease
+(``JOB_LEASE_SECONDS``), and a job whose lease ran out (its worker died) is
+claimed again. Every claim counts as an attempt, so a job that keeps killing
+its worker or outliving its lease is marked ``failed`` once it has used up
+its attempts instead of being reclaimed forever.
+
+A failing job is retried with exponential backoff (``JOB_RETRY_BASE_SECONDS``
+doubled per attempt) up to ``JOB_MAX_ATTEMPTS`` times and then left as
+``failed`` with its last error. Handlers must be idempotent, since a retry
+may repeat work that already happened.
+
+Settings: ``JOB_WORKERS`` (0 disables the workers in this process),
+``JOB_POLL_SECONDS``, ``JOB_DELETE_BATCH_SIZE``.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from .database import async_db
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 5))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", 10))
+JOB_DELETE_BATCH_SIZE = int(os.getenv("JOB_DELETE_BATCH_SIZE", 1000))
+
+
+async def delete_in_batches(collection, query: dict, batch_size: int = JOB_DELETE_BATCH_SIZE) -> int:
+    """``delete_many`` in slices of ``batch_size`` documents.
+
+    Each slice is a short operation, so a huge delete neither holds locks for
+    long nor starves the requests sharing the event loop and the server.
+    """
+    deleted = 0
+    while True:
+        ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return deleted
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        await asyncio.sleep(0)
+
+
+class JobQueue:
+    def __init__(self, collection=None, workers: int = JOB_WORKERS):
+        self.collection = collection if collection is not None else async_db.jobs
+        self.workers = workers
+        self.handlers = {}
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def handler(self, job_type: str):
+        """Decorator registering ``async def fn(payload)`` for ``job_type``."""
+        def register(fn):
+            self.handlers[job_type] = fn
+            return fn
+        return register
+
+    async def enqueue(self, job_type: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS):
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for job type {job_type!r}")
+        now = datetime.now(timezone.utc)
+        result = await self.collection.insert_one({
+            "type": job_type,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_at": now,
+            "created_at": now,
+        })
+        self._wakeup.set()
+        return result.inserted_id
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def claim(self):
+        """Take the next due job (or one whose lease expired), or None."""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {
+                    "status": "running",
+                    "locked_until": {"$lt": now},
+                    "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+                },
+            ]},
+            {
+                "$set": {"status": "running", "locked_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def fail_abandoned(self) -> int:
+        """Mark jobs whose lease expired on their last attempt as ``failed``."""
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_many(
+            {
+                "status": "running",
+                "locked_until": {"$lt": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+            },
+            {
+                "$set": {"status": "failed", "finished_at": now, "last_error": "lease expired on the last attempt"},
+                "$unset": {"locked_until": ""},
+            },
+        )
+        if result.modified_count:
+            self.failed += result.modified_count
+            logger.error("Marked %d abandoned jobs as failed", result.modified_count)
+        return result.modified_count
+
+    async def run_one(self, job: dict):
+        handler = self.handlers.get(job["type"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job type {job['type']!r}")
+            await handler(job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            now = datetime.now(timezone.utc)
+            if job["attempts"] < job.get("max_attempts", JOB_MAX_ATTEMPTS):
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+                update = {"status": "queued", "run_at": now + timedelta(seconds=delay)}
+                self.retried += 1
+                logger.warning("Job %s (%s) failed, retrying in %.0fs: %s", job["_id"], job["type"], delay, error)
+            else:
+                update = {"status": "failed", "finished_at": now}
+                self.failed += 1
+                logger.error("Job %s (%s) failed permanently: %s", job["_id"], job["type"], error)
+            await self.collection.update_one(
+                {"_id": job["_id"]},
+                {"$set": {**update, "last_error": repr(error)}, "$unset": {"locked_until": ""}},
+            )
+            return
+        await self.collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}, "$unset": {"locked_until": ""}},
+        )
+        self.completed += 1
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("Could not claim a job: %s", error)
+                job = None
+            if job is not None:
+                try:
+                    await self.run_one(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as error:
+                    # Recording the outcome failed; the lease hands the job back later
+                    logger.warning("Could not record the result of job %s: %s", job["_id"], error)
+                continue
+            try:
+                await self.fail_abandoned()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("Could not check for abandoned jobs: %s", error)
+            # Idle until something is enqueued here or the next poll (other processes, retries)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stats(self) -> dict:
+        counts = {}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return {
+            "workers": len(self._tasks),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "by_status": counts,
+        }
+
+
+job_queue = JobQueue()
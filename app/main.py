@@ -1,9 +1,40 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from . import auth, course, semester, timetable, study_groups
+from . import auth, course, semester, timetable, study_groups, admin
+from .indexes import ensure_indexes
+from .utils import password_hasher
+from .pagination import NEXT_CURSOR_HEADER
+from .broker import broker
+from .jobs import job_queue
+from .activity import activity_buffer
+from .ingest import ACK_HEADER, message_ingest
+from .dbstats import DB_CALLS_HEADER, count_body, track_request
 from fastapi.routing import APIRoute
 
-app = FastAPI()
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Raises RequiredIndexesMissing, refusing to start, if a unique index could not be built
+    if ENSURE_INDEXES_ON_STARTUP:
+        await ensure_indexes()
+    password_hasher.start()
+    await broker.start()
+    await job_queue.start()
+    await activity_buffer.start()
+    await message_ingest.start()
+    yield
+    await message_ingest.stop()
+    await activity_buffer.stop()
+    await job_queue.stop()
+    await broker.stop()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,13 +42,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, DB_CALLS_HEADER, ACK_HEADER],
 )
 
+
+@app.middleware("http")
+async def count_db_calls(request: Request, call_next):
+    counter = track_request()
+    response = await call_next(request)
+    # Calls made until the response starts; streamed bodies are logged by count_body
+    response.headers[DB_CALLS_HEADER] = str(counter.calls)
+    response.body_iterator = count_body(response.body_iterator, counter, f"{request.method} {request.url.path}")
+    return response
+
 app.include_router(auth.router)
 app.include_router(course.router)
 app.include_router(semester.router)
 app.include_router(timetable.router)
 app.include_router(study_groups.router)
+app.include_router(admin.router)
 
 for route in app.routes:
     if isinstance(route, APIRoute):
@@ -25,5 +68,5 @@ for route in app.routes:
 
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Academate API (MongoDB) is running 🚀"}
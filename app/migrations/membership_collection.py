@@ -0,0 +1,157 @@
+"""Make ``group_members`` the only record of who belongs to a study group.
+
+    python -m app.migrations.membership_collection [--batch-size 500] [--dry-run] [--keep-array]
+
+Steps, each safe to re-run:
+
+1. remove duplicate ``group_members`` records (keeping the creator record, else
+   the earliest one) so the unique ``group_user_unique`` index can be built;
+2. backfill a record for every id still listed in a ``study_groups.members``
+   array;
+3. build ``group_user_unique``, then drop the old non-unique ``group_user``
+   index on the same keys and ``members_last_activity``;
+4. recompute ``member_count`` from the records;
+5. ``$unset`` the ``members`` arrays (skipped with ``--keep-array``).
+
+Until step 3 has run, an existing deployment with duplicate records cannot
+build the unique index and the API refuses to start (``RequiredIndexesMissing``).
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from ..database import async_db
+from ..indexes import INDEXES
+
+
+async def remove_duplicates(dry_run: bool) -> int:
+    duplicates = async_db.group_members.aggregate([
+        # Creator records sort first, then the oldest
+        {"$sort": {"role": 1, "joined_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": {"group_id": "$group_id", "user_id": "$user_id"},
+            "records": {"$push": {"_id": "$_id", "role": "$role"}},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    removed = 0
+    async for duplicate in duplicates:
+        records = duplicate["records"]
+        keep = next((r for r in records if r.get("role") == "creator"), records[0])
+        extra = [r["_id"] for r in records if r["_id"] != keep["_id"]]
+        if not dry_run:
+            await async_db.group_members.delete_many({"_id": {"$in": extra}})
+        removed += len(extra)
+    return removed
+
+
+async def backfill(batch_size: int, dry_run: bool) -> int:
+    groups = async_db.study_groups.find(
+        {"members": {"$exists": True}},
+        {"members": 1, "creator_id": 1, "created_at": 1}
+    )
+    operations = []
+    upserted = 0
+    async for group in groups:
+        group_id = str(group["_id"])
+        joined_at = group.get("created_at") or datetime.now(timezone.utc)
+        for user_id in dict.fromkeys(group.get("members") or []):
+            operations.append(UpdateOne(
+                {"group_id": group_id, "user_id": user_id},
+                {"$setOnInsert": {
+                    "role": "creator" if user_id == group.get("creator_id") else "member",
+                    "joined_at": joined_at,
+                }},
+                upsert=True,
+            ))
+        if len(operations) >= batch_size:
+            upserted += await _flush(operations, dry_run)
+            operations = []
+    if operations:
+        upserted += await _flush(operations, dry_run)
+    return upserted
+
+
+async def _flush(operations: list, dry_run: bool) -> int:
+    if dry_run:
+        return len(operations)
+    result = await async_db.group_members.bulk_write(operations, ordered=False)
+    return result.upserted_count
+
+
+async def replace_indexes(dry_run: bool) -> list:
+    changes = []
+    group_indexes = await async_db.study_groups.index_information()
+    if "members_last_activity" in group_indexes:
+        changes.append("drop study_groups.members_last_activity")
+        if not dry_run:
+            await async_db.study_groups.drop_index("members_last_activity")
+    # Build the unique index before dropping the old one so lookups stay indexed
+    if not dry_run:
+        await async_db.group_members.create_indexes(INDEXES["group_members"])
+    member_indexes = await async_db.group_members.index_information()
+    if "group_user" in member_indexes:
+        changes.append("drop group_members.group_user (replaced by group_user_unique)")
+        if not dry_run:
+            await async_db.group_members.drop_index("group_user")
+    return changes
+
+
+async def recount(batch_size: int, dry_run: bool) -> int:
+    counts = {}
+    async for row in async_db.group_members.aggregate([{"$group": {"_id": "$group_id", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+
+    operations = []
+    updated = 0
+    async for group in async_db.study_groups.find({}, {"member_count": 1}):
+        count = counts.get(str(group["_id"]), 0)
+        if group.get("member_count") != count:
+            operations.append(UpdateOne({"_id": group["_id"]}, {"$set": {"member_count": count}}))
+        if len(operations) >= batch_size:
+            updated += await _apply_group_updates(operations, dry_run)
+            operations = []
+    if operations:
+        updated += await _apply_group_updates(operations, dry_run)
+    return updated
+
+
+async def _apply_group_updates(operations: list, dry_run: bool) -> int:
+    if dry_run:
+        return len(operations)
+    result = await async_db.study_groups.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+async def migrate(batch_size: int, dry_run: bool, keep_array: bool) -> dict:
+    counts = {"duplicates_removed": await remove_duplicates(dry_run)}
+    counts["records_backfilled"] = await backfill(batch_size, dry_run)
+    for change in await replace_indexes(dry_run):
+        print(change)
+    counts["counts_fixed"] = await recount(batch_size, dry_run)
+    counts["arrays_removed"] = 0
+    if not keep_array:
+        query = {"members": {"$exists": True}}
+        if dry_run:
+            counts["arrays_removed"] = await async_db.study_groups.count_documents(query)
+        else:
+            result = await async_db.study_groups.update_many(query, {"$unset": {"members": ""}})
+            counts["arrays_removed"] = result.modified_count
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move study group membership into group_members")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--keep-array", action="store_true", help="leave study_groups.members in place")
+    args = parser.parse_args(argv)
+    counts = asyncio.run(migrate(args.batch_size, args.dry_run, args.keep_array))
+    print(", ".join(f"{key}: {value}" for key, value in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
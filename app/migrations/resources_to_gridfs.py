@@ -0,0 +1,76 @@
+"""Move base64 payloads out of ``group_resources`` into chunked storage.
+
+    python -m app.migrations.resources_to_gridfs [--batch-size 20] [--dry-run]
+
+Safe to re-run: each resource is only rewritten while it still has
+``file_base64``, and a file uploaded for a resource that was concurrently
+migrated is removed again.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+
+from ..database import async_db
+from .. import storage
+
+
+async def migrate(batch_size: int, dry_run: bool) -> dict:
+    counts = {"migrated": 0, "corrupted": 0, "skipped": 0}
+    query = {"file_base64": {"$exists": True}, "file_id": {"$exists": False}}
+    # Only ids are read up front; payloads are loaded one at a time
+    ids = [doc["_id"] async for doc in async_db.group_resources.find(query, {"_id": 1})]
+
+    for offset in range(0, len(ids), batch_size):
+        for resource_id in ids[offset:offset + batch_size]:
+            resource = await async_db.group_resources.find_one({"_id": resource_id, **query})
+            if not resource:
+                counts["skipped"] += 1
+                continue
+            try:
+                file_bytes = base64.b64decode(resource["file_base64"], validate=True)
+            except (binascii.Error, ValueError, TypeError):
+                counts["corrupted"] += 1
+                print(f"Corrupted payload, left in place: {resource_id}")
+                continue
+            if dry_run:
+                counts["migrated"] += 1
+                continue
+
+            stored = await storage.store_bytes(
+                file_bytes,
+                filename=resource.get("name", "download"),
+                content_type=resource.get("file_type", "application/octet-stream"),
+                metadata={"group_id": resource["group_id"], "resource_id": str(resource_id)},
+            )
+            result = await async_db.group_resources.update_one(
+                {"_id": resource_id, **query},
+                {
+                    "$set": {
+                        "file_id": stored["file_id"],
+                        "file_size": stored["length"],
+                        "sha256": stored["sha256"],
+                    },
+                    "$unset": {"file_base64": ""},
+                },
+            )
+            if result.modified_count:
+                counts["migrated"] += 1
+            else:
+                await storage.delete_file(stored["file_id"])
+                counts["skipped"] += 1
+        print(f"Processed {min(offset + batch_size, len(ids))}/{len(ids)} resources")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move base64 group resources into GridFS")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+    counts = asyncio.run(migrate(args.batch_size, args.dry_run))
+    print(", ".join(f"{key}: {value}" for key, value in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import base64
+from bson import json_util
+from fastapi import Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(doc: dict, sort: list) -> str:
+    """Build an opaque cursor from the sort-key values of the last returned ``doc``."""
+    values = {field: doc[field] for field, _ in sort}
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: list) -> dict:
+    """Inverse of ``encode_cursor``. Raises ``ValueError`` for malformed tokens."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception as error:
+        raise ValueError("Invalid cursor") from error
+    if not isinstance(values, dict) or any(field not in values for field, _ in sort):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_filter(sort: list, values: dict) -> dict:
+    """Match documents strictly after ``values`` in ``sort`` order.
+
+    For ``sort = [(a, -1), (b, -1)]`` this is
+    ``{"$or": [{a: {"$lt": va}}, {a: va, b: {"$lt": vb}}]}``, which lets an
+    index on the same keys seek straight to the page instead of skipping.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev: values[prev] for prev, _ in sort[:i]}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[field]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def fetch_page(cursor, sort: list, limit: int, response: Response = None) -> list:
+    """Read ``limit`` documents from a Motor ``cursor`` already filtered and sorted by ``sort``.
+
+    One extra document is read to decide whether there is a next page; if
+    there is, its cursor is set in the ``X-Next-Cursor`` header of ``response``.
+    """
+    docs = await cursor.limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if response is not None and has_more and docs:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort)
+    return docs
@@ -0,0 +1,31 @@
+"""MongoDB projections for read paths, derived from the response schemas.
+
+Listing endpoints only read the fields their response model declares, so
+heavy fields that are never sent (``file_base64`` on legacy resources,
+whole ``members`` arrays, ...) are not read from MongoDB.
+"""
+from . import schemas
+
+
+def model_projection(model, exclude=()) -> dict:
+    """Inclusion projection with every (aliased) field of ``model`` except ``exclude``."""
+    projection = {}
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        if key not in exclude:
+            projection[key] = 1
+    return projection
+
+
+COURSE_LIST = model_projection(schemas.CourseResponse)
+STUDY_BLOCK_LIST = model_projection(schemas.StudyBlockResponse)
+# Membership comes from group_members, not the group document
+STUDY_GROUP_LIST = model_projection(schemas.StudyGroupResponse, exclude=("members", "is_member"))
+# user_info is joined in from users, not stored
+GROUP_MEMBER_LIST = model_projection(schemas.StudyGroupMemberResponse, exclude=("user_info",))
+DISCUSSION_MESSAGE_LIST = model_projection(schemas.DiscussionMessageResponse)
+GROUP_RESOURCE_LIST = model_projection(schemas.GroupResourceResponse)
+GROUP_TIMETABLE_EVENT_LIST = model_projection(schemas.GroupTimetableEventResponse)
+
+# Everything needed to serve a download except a legacy inline payload
+GROUP_RESOURCE_DOWNLOAD = {"file_base64": 0}
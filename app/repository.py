@@ -0,0 +1,47 @@
+"""Shared write helpers that combine the check and the write into one round trip."""
+from typing import Optional, Tuple
+from pymongo import ReturnDocument
+
+
+async def update_and_fetch(
+    collection,
+    query: dict,
+    update: dict,
+    projection: Optional[dict] = None,
+    upsert: bool = False,
+) -> Optional[dict]:
+    """Apply ``update`` to the document matching ``query`` and return it as it is afterwards.
+
+    Returns None when nothing matched (and ``upsert`` is off).
+    """
+    return await collection.find_one_and_update(
+        query,
+        update,
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+        upsert=upsert,
+    )
+
+
+async def update_if(
+    collection,
+    match: dict,
+    conditions: dict,
+    update: dict,
+    projection: Optional[dict] = None,
+    explain_projection: Optional[dict] = None,
+) -> Tuple[Optional[dict], Optional[dict]]:
+    """Update the document matching ``match`` only while ``conditions`` hold.
+
+    The check and the write are a single ``find_one_and_update``, so the happy path
+    is one round trip and no other request can slip in between them. Returns
+    ``(updated, None)`` on success. Otherwise returns ``(None, current)``, where
+    ``current`` is the document matching ``match`` alone, read with
+    ``explain_projection`` (None if it does not exist), so the caller can say why
+    the update was refused.
+    """
+    updated = await update_and_fetch(collection, {**match, **conditions}, update, projection)
+    if updated is not None:
+        return updated, None
+    current = await collection.find_one(match, explain_projection or {"_id": 1})
+    return None, current
@@ -0,0 +1,270 @@
+"""Weekly timetable algorithms: free-slot computation and study-session allocation.
+
+Times are handled as minutes since midnight. ``day`` follows
+``StudyBlockBase`` (1 = Monday ... 7 = Sunday).
+"""
+import heapq
+import math
+import time
+
+DIFFICULTY_WEIGHT = {"easy": 1.0, "medium": 1.5, "hard": 2.0}
+DIFFICULTY_RANK = {"hard": 0, "medium": 1, "easy": 2}
+PRIORITY_FOR_DIFFICULTY = {"hard": "high", "medium": "medium", "easy": "low"}
+COLORS = ["#3b82f6", "#10b981", "#f59e0b", "#ef4444", "#8b5cf6", "#ec4899", "#14b8a6", "#f97316"]
+
+
+def parse_time(value: str) -> int:
+    """``"HH:MM"`` -> minutes since midnight. Raises ``ValueError`` on bad input."""
+    hours, minutes = (int(part) for part in value.strip().split(":")[:2])
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"Time out of range: {value}")
+    return hours * 60 + minutes
+
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def merge_intervals(intervals: list) -> list:
+    """Sort and merge overlapping ``(start, end)`` pairs."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def free_intervals(busy: list, window_start: int, window_end: int) -> list:
+    """Gaps inside ``[window_start, window_end)`` not covered by ``busy``."""
+    free = []
+    cursor = window_start
+    for start, end in merge_intervals(busy):
+        if end <= cursor:
+            continue
+        if start >= window_end:
+            break
+        if start > cursor:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < window_end:
+        free.append((cursor, window_end))
+    return free
+
+
+def busy_by_day(blocks: list) -> dict:
+    """Group existing blocks (dicts with day/startTime/endTime) into per-day intervals."""
+    days = {}
+    for block in blocks:
+        try:
+            start, end = parse_time(block["startTime"]), parse_time(block["endTime"])
+        except (KeyError, ValueError, AttributeError):
+            continue
+        if end > start:
+            days.setdefault(block["day"], []).append((start, end))
+    return days
+
+
+def allocate(
+    courses: list,
+    existing_blocks: list,
+    days=range(1, 8),
+    day_start: str = "08:00",
+    day_end: str = "22:00",
+    session_minutes: int = 60,
+    break_minutes: int = 15,
+    minutes_per_unit: int = 60,
+    max_minutes_per_day: int = 240,
+    time_budget_ms: float = 50.0,
+) -> dict:
+    """Pack study sessions for ``courses`` into the free time around ``existing_blocks``.
+
+    Each course needs ``unit * minutes_per_unit * difficulty weight`` minutes a
+    week, split into ``session_minutes`` sessions. Sessions are placed one at a
+    time, always for the course with the most weighted demand left
+    (``difficulty weight * remaining sessions``, from a max-heap), so hard,
+    heavy courses claim the early and roomy slots while lighter courses still
+    get their turn as the others' demand shrinks. Each session goes on the day
+    with the most free study time that does not already have that course, at
+    the earliest gap it fits in. Placement stops when ``time_budget_ms`` is
+    spent.
+
+    Every existing block is kept clear of (plus ``break_minutes`` either side),
+    but only existing ``type == "study"`` blocks count towards
+    ``max_minutes_per_day``, the cap on study time per day.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget_ms / 1000
+    window_start, window_end = parse_time(day_start), parse_time(day_end)
+    busy = busy_by_day(existing_blocks)
+    # Classes and other commitments only take time away; the daily cap is on study time
+    studying = busy_by_day([block for block in existing_blocks if block.get("type") == "study"])
+
+    # Per-day free gaps, padded by the break so sessions never touch other blocks
+    gaps = {}
+    capacity = {}
+    for day in days:
+        padded = [(s - break_minutes, e + break_minutes) for s, e in busy.get(day, [])]
+        gaps[day] = [list(gap) for gap in free_intervals(padded, window_start, window_end)]
+        already = sum(e - s for s, e in studying.get(day, []))
+        capacity[day] = max(0, max_minutes_per_day - already)
+
+    demand = []
+    for index, course in enumerate(courses):
+        difficulty = (course.get("difficulty") or "medium").lower()
+        if difficulty not in DIFFICULTY_WEIGHT:
+            difficulty = "medium"
+        weight = DIFFICULTY_WEIGHT[difficulty]
+        weekly = (course.get("unit") or 0) * minutes_per_unit * weight
+        demand.append({
+            "index": index,
+            "course": course,
+            "difficulty": difficulty,
+            "weight": weight,
+            "remaining": math.ceil(weekly / session_minutes) if session_minutes > 0 else 0,
+            "days_used": set(),
+        })
+
+    blocks = []
+    truncated = False
+    # Max-heap of days by remaining capacity; entries are refreshed lazily
+    heap = [(-capacity[day], day) for day in days]
+    heapq.heapify(heap)
+
+    def place(day: int) -> tuple:
+        if capacity[day] < session_minutes:
+            return None
+        for gap in gaps[day]:
+            if gap[1] - gap[0] >= session_minutes:
+                start = gap[0]
+                gap[0] = start + session_minutes + break_minutes
+                return start, start + session_minutes
+        return None
+
+    # Max-heap of courses by weighted remaining demand; ties go to the harder,
+    # then heavier, then earlier-listed course
+    def demand_key(item: dict) -> tuple:
+        return (
+            -item["weight"] * item["remaining"],
+            DIFFICULTY_RANK[item["difficulty"]],
+            -(item["course"].get("unit") or 0),
+            item["index"],
+        )
+
+    pending = [(demand_key(item), item) for item in demand if item["remaining"] > 0]
+    heapq.heapify(pending)
+    while pending:
+        if time.perf_counter() > deadline:
+            truncated = True
+            break
+        _, item = heapq.heappop(pending)
+        skipped = []
+        slot = None
+        while heap:
+            neg_capacity, day = heapq.heappop(heap)
+            if -neg_capacity != capacity[day]:
+                heapq.heappush(heap, (-capacity[day], day))
+                continue
+            if day in item["days_used"] and len(item["days_used"]) < len(capacity):
+                skipped.append((neg_capacity, day))
+                continue
+            slot = place(day)
+            if slot:
+                break
+            skipped.append((-capacity[day], day))
+        # Spread failed: allow a second session on a day the course already uses
+        if slot is None:
+            for _, day in sorted(skipped, key=lambda entry: entry[0]):
+                slot = place(day)
+                if slot:
+                    break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if slot is None:
+            # Gaps and capacity only shrink, so this course will not fit later either
+            continue
+
+        capacity[day] -= session_minutes
+        heapq.heappush(heap, (-capacity[day], day))
+        item["days_used"].add(day)
+        item["remaining"] -= 1
+        course = item["course"]
+        blocks.append({
+            "title": f"Study {course.get('name', '')}".strip(),
+            "course": course.get("code") or course.get("name", ""),
+            "startTime": format_time(slot[0]),
+            "endTime": format_time(slot[1]),
+            "day": day,
+            "duration": session_minutes,
+            "difficulty": item["difficulty"],
+            "priority": PRIORITY_FOR_DIFFICULTY[item["difficulty"]],
+            "type": "study",
+            "color": COLORS[item["index"] % len(COLORS)],
+        })
+        if item["remaining"] > 0:
+            heapq.heappush(pending, (demand_key(item), item))
+
+    unplaced = [
+        {"course": d["course"].get("code") or d["course"].get("name", ""), "sessions": d["remaining"]}
+        for d in demand if d["remaining"] > 0
+    ]
+    return {
+        "blocks": sorted(blocks, key=lambda b: (b["day"], b["startTime"])),
+        "unplaced": unplaced,
+        "truncated": truncated,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def block_interval(block: dict):
+    """``(day, start, end)`` for a block, or ``None`` if its times are unusable."""
+    try:
+        start, end = parse_time(block["startTime"]), parse_time(block["endTime"])
+    except (KeyError, ValueError, AttributeError):
+        return None
+    if end <= start:
+        return None
+    return block.get("day"), start, end
+
+
+def find_conflicts(blocks: list, only_involving=None) -> tuple:
+    """Report every pair of overlapping blocks.
+
+    Blocks are grouped by day, sorted by start time and swept once while
+    a min-heap holds the blocks still running (ordered by end time). Each
+    new block overlaps exactly the blocks left in the heap. Cost is
+    O(n log n + k) for k reported overlaps. Back-to-back blocks (one ends
+    when the next starts) do not conflict.
+
+    ``only_involving`` (a set of indices) restricts the report to pairs
+    that include at least one of those blocks. Returns ``(conflicts,
+    invalid)``: conflicts are ``(i, j, day, overlap_start, overlap_end)``
+    with ``i < j``, and invalid lists the indices of blocks with unusable
+    times.
+    """
+    by_day = {}
+    invalid = []
+    for index, block in enumerate(blocks):
+        interval = block_interval(block)
+        if interval is None:
+            invalid.append(index)
+            continue
+        day, start, end = interval
+        by_day.setdefault(day, []).append((start, end, index))
+
+    conflicts = []
+    for day, intervals in by_day.items():
+        intervals.sort()
+        running = []  # (end, index, start)
+        for start, end, index in intervals:
+            while running and running[0][0] <= start:
+                heapq.heappop(running)
+            for other_end, other_index, other_start in running:
+                if only_involving is not None and index not in only_involving and other_index not in only_involving:
+                    continue
+                first, second = sorted((index, other_index))
+                conflicts.append((first, second, day, max(start, other_start), min(end, other_end)))
+            heapq.heappush(running, (end, index, start))
+    conflicts.sort(key=lambda c: (c[2], c[3], c[0], c[1]))
+    return conflicts, invalid
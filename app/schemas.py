@@ -47,6 +47,7 @@ class SemesterCourseResponse(SemesterCourseBase):
 
 class SemesterBase(BaseModel):
     name: str
+    order: Optional[int] = None  # explicit chronological position; unset sorts by creation time
 
 class SemesterCreate(SemesterBase):
     courses: List[SemesterCourseCreate] = []
@@ -62,6 +63,40 @@ class CGPASummaryResponse(BaseModel):
     change: float
     latest_semester: Optional[str] = None
 
+class GPAHistoryEntry(BaseModel):
+    semester_id: str
+    name: str
+    order: Optional[int] = None
+    gpa: float
+    units: int
+    cgpa: float  # running CGPA up to and including this semester
+    cumulative_units: int
+
+# What-if CGPA projection
+class HypotheticalCourse(BaseModel):
+    name: str
+    unit: conint(ge=1)
+
+class CGPAProjectionRequest(BaseModel):
+    target_cgpa: float = Field(..., ge=0, le=5)
+    courses: List[HypotheticalCourse] = Field(..., min_length=1, max_length=8)
+    max_results: conint(ge=1, le=100) = 10
+
+class GradeCombination(BaseModel):
+    grades: dict  # course name -> grade letter
+    semester_gpa: float
+    projected_cgpa: float
+
+class CGPAProjectionResponse(BaseModel):
+    current_cgpa: float
+    target_cgpa: float
+    reachable: bool
+    max_possible_cgpa: float
+    combinations_evaluated: int
+    minimal_combinations: int
+    solutions: List[GradeCombination] = []
+    compute_ms: float
+
 # Study Block schemas for timetable
 class StudyBlockBase(BaseModel):
     title: str
@@ -81,6 +116,62 @@ class StudyBlockCreate(StudyBlockBase):
 class StudyBlockResponse(StudyBlockBase):
     id: str = Field(..., alias="_id")
 
+class StudyBlockSync(StudyBlockBase):
+    id: Optional[str] = None  # existing block to keep/update; omitted for new blocks
+
+class StudyBlockSyncResponse(BaseModel):
+    blocks: List[StudyBlockResponse]
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+class BlockRef(BaseModel):
+    source: str  # "submitted" | "existing"
+    index: Optional[int] = None  # position in the submitted list
+    id: Optional[str] = None  # stored block id
+    title: str
+    day: int
+    startTime: str
+    endTime: str
+
+class BlockConflict(BaseModel):
+    first: BlockRef
+    second: BlockRef
+    day: int
+    overlap_start: str
+    overlap_end: str
+    overlap_minutes: int
+
+class ConflictCheckRequest(BaseModel):
+    blocks: List[StudyBlockCreate]
+    include_existing: bool = True  # also check against the stored timetable
+    ignore_block_ids: List[str] = []  # stored blocks being edited or replaced
+
+class ConflictCheckResponse(BaseModel):
+    conflicts: List[BlockConflict] = []
+    invalid: List[BlockRef] = []
+
+class AllocationRequest(BaseModel):
+    days: List[conint(ge=1, le=7)] = [1, 2, 3, 4, 5, 6, 7]
+    day_start: str = "08:00"
+    day_end: str = "22:00"
+    session_minutes: conint(ge=15, le=240) = 60
+    break_minutes: conint(ge=0, le=120) = 15
+    minutes_per_unit: conint(ge=0, le=600) = 60
+    max_minutes_per_day: conint(ge=0, le=1440) = 240
+    course_ids: Optional[List[str]] = None  # defaults to all of the user's courses
+
+class UnplacedSessions(BaseModel):
+    course: str
+    sessions: int
+
+class AllocationResponse(BaseModel):
+    blocks: List[StudyBlockCreate]
+    unplaced: List[UnplacedSessions] = []
+    truncated: bool = False
+    elapsed_ms: float
+
 # Study Group schemas
 class StudyGroupBase(BaseModel):
     name: str
@@ -96,7 +187,15 @@ class StudyGroupCreate(StudyGroupBase):
 class StudyGroupResponse(StudyGroupBase):
     id: str = Field(..., alias="_id")
     creator_id: str
-    members: List[str] = []
+    members: List[str] = Field(
+        [],
+        description=(
+            "Deprecated: use is_member and GET /study-groups/{id}/members. Lists every member id "
+            "on GET /study-groups/{id}; elsewhere only the caller's own id when they belong."
+        ),
+        json_schema_extra={"deprecated": True},
+    )
+    is_member: bool = False
     member_count: int = 0
     created_at: datetime
     is_active: bool = True
@@ -149,6 +248,7 @@ class GroupResourceResponse(GroupResourceBase):
     uploader_name: str
     uploaded_at: datetime
     download_url: str
+    sha256: Optional[str] = None
 
 # Group Timetable Event schemas
 class GroupTimetableEventBase(BaseModel):
@@ -1,26 +1,33 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
-from .database import db
-from .schemas import SemesterCreate, SemesterResponse, SemesterCourseCreate, SemesterCourseResponse, CGPASummaryResponse
+from pymongo import ReturnDocument
+from .database import async_db
+from .schemas import (
+    SemesterCreate, SemesterResponse, SemesterCourseCreate, SemesterCourseResponse,
+    CGPASummaryResponse, GPAHistoryEntry, CGPAProjectionRequest, CGPAProjectionResponse
+)
 from .dependencies import get_current_user
+from . import cgpa, whatif
 
 router = APIRouter(prefix="/semesters", tags=["Semesters"])
 
 @router.post("/", response_model=SemesterResponse)
-def create_semester(semester: SemesterCreate, user=Depends(get_current_user)):
+async def create_semester(semester: SemesterCreate, user=Depends(get_current_user)):
     sem_doc = semester.dict()
     sem_doc["user_id"] = str(user["_id"])
     sem_doc["courses"] = []
-    result = db.semesters.insert_one(sem_doc)
+    result = await async_db.semesters.insert_one(sem_doc)
     sem_doc["_id"] = str(result.inserted_id)
+    await cgpa.record_semester(sem_doc["user_id"], sem_doc["_id"], sem_doc["name"], sem_doc.get("order"))
     return SemesterResponse(**sem_doc)
 
 from fastapi.responses import JSONResponse
 
 @router.get("/", response_model=list[SemesterResponse])
-def get_semesters(user=Depends(get_current_user)):
+async def get_semesters(user=Depends(get_current_user)):
     try:
-        semesters = list(db.semesters.find({"user_id": str(user["_id"])}))
+        semesters = await async_db.semesters.find({"user_id": str(user["_id"])}).to_list(length=None)
         for sem in semesters:
             sem["_id"] = str(sem["_id"])
             sem["courses"] = sem.get("courses") or []
@@ -33,71 +40,93 @@ def get_semesters(user=Depends(get_current_user)):
 
 
 @router.post("/{semester_id}/courses", response_model=SemesterCourseResponse)
-def add_course(semester_id: str, course: SemesterCourseCreate, user=Depends(get_current_user)):
+async def add_course(semester_id: str, course: SemesterCourseCreate, user=Depends(get_current_user)):
     course_doc = course.dict()
     course_doc["_id"] = ObjectId()
-    result = db.semesters.update_one(
+    result = await async_db.semesters.update_one(
         {"_id": ObjectId(semester_id), "user_id": str(user["_id"])},
         {"$push": {"courses": course_doc}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Semester not found")
+    await cgpa.apply_course_delta(str(user["_id"]), semester_id, *cgpa.course_totals(course_doc))
     course_doc["_id"] = str(course_doc["_id"])
     return SemesterCourseResponse(**course_doc)
 
 @router.delete("/courses/{course_id}")
-def delete_course(course_id: str, user=Depends(get_current_user)):
-    result = db.semesters.update_one(
+async def delete_course(course_id: str, user=Depends(get_current_user)):
+    # Returns the semester as it was, with only the removed course, for the CGPA delta
+    before = await async_db.semesters.find_one_and_update(
         {"user_id": str(user["_id"]), "courses._id": ObjectId(course_id)},
-        {"$pull": {"courses": {"_id": ObjectId(course_id)}}}
+        {"$pull": {"courses": {"_id": ObjectId(course_id)}}},
+        projection={"courses.$": 1},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.modified_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Course not found")
+    points, units = cgpa.course_totals(before["courses"][0])
+    await cgpa.apply_course_delta(str(user["_id"]), str(before["_id"]), -points, -units)
     return {"message": "Course deleted successfully"}
 
 @router.put("/{sem_id}/courses/{course_id}")
-def update_course(sem_id: str, course_id: str, update: dict, user=Depends(get_current_user)):
-    result = db.semesters.update_one(
+async def update_course(sem_id: str, course_id: str, update: dict, user=Depends(get_current_user)):
+    field, value = list(update.items())[0]
+    before = await async_db.semesters.find_one_and_update(
         {"_id": ObjectId(sem_id), "user_id": str(user["_id"]), "courses._id": ObjectId(course_id)},
         {"$set": {
-            f"courses.$.{list(update.keys())[0]}": list(update.values())[0]
-        }}
+            f"courses.$.{field}": value
+        }},
+        projection={"courses.$": 1},
+        return_document=ReturnDocument.BEFORE
     )
-    return {"success": result.modified_count > 0}
-
-
-@router.get("/cgpa/summary", response_model=CGPASummaryResponse)  # define proper Pydantic model
-def get_cgpa_summary(user=Depends(get_current_user)):
-    semesters = list(db.semesters.find({"user_id": str(user["_id"])}))
-    grade_point_map = {"A": 5, "B": 4, "C": 3, "D": 2, "E": 1, "F": 0}
+    if before is None:
+        return {"success": False}
+    old_course = before["courses"][0]
+    if old_course.get(field) == value:
+        return {"success": False}
+    old_points, old_units = cgpa.course_totals(old_course)
+    new_points, new_units = cgpa.course_totals({**old_course, field: value})
+    await cgpa.apply_course_delta(str(user["_id"]), sem_id, new_points - old_points, new_units - old_units)
+    return {"success": True}
 
-    cumulative_points = 0
-    cumulative_units = 0
-    semester_count = len(semesters)
-    latest_semester = None
 
-    for sem in semesters:
-        sem_points = 0
-        sem_units = 0
-        for course in sem.get("courses", []):
-            unit = course.get("unit", 0)
-            grade = (course.get("grade") or "F").upper()
-            gp = grade_point_map.get(grade, 0)
-            sem_points += gp * unit
-            sem_units += unit
-        cumulative_points += sem_points
-        cumulative_units += sem_units
-        if not latest_semester or sem["name"] > latest_semester:
-            latest_semester = sem["name"]
+@router.get("/cgpa/summary", response_model=CGPASummaryResponse)
+async def get_cgpa_summary(user=Depends(get_current_user)):
+    summary = await cgpa.get_summary(str(user["_id"]))
 
-    cgpa = (cumulative_points / cumulative_units) if cumulative_units else 0.0
+    semesters = cgpa.ordered_semesters(summary)
+    latest_semester = semesters[-1][1]["name"] if semesters else None
 
-    # For 'change' you might calculate difference from last semester GPA if you want
+    cumulative_units = summary.get("total_units", 0)
+    cgpa_value = cgpa.gpa(summary.get("total_points", 0), cumulative_units)
 
     return {
-        "cgpa": round(cgpa, 2),
+        "cgpa": round(cgpa_value, 2),
         "total_credits": cumulative_units,
-        "semester_count": semester_count,
-        "change": 0,  # placeholder, implement if you want
+        "semester_count": summary.get("semester_count", 0),
+        "change": round(cgpa.semester_change(summary), 2),
         "latest_semester": latest_semester,
     }
+
+@router.get("/cgpa/history", response_model=list[GPAHistoryEntry])
+async def get_gpa_history(user=Depends(get_current_user)):
+    """GPA per semester and the running CGPA, oldest semester first."""
+    return await cgpa.gpa_history(str(user["_id"]))
+
+@router.post("/cgpa/project", response_model=CGPAProjectionResponse)
+async def project_cgpa(request: CGPAProjectionRequest, user=Depends(get_current_user)):
+    """Find the least demanding grade sets for hypothetical courses that reach a target CGPA."""
+    summary = await cgpa.get_summary(str(user["_id"]))
+    # NumPy work runs off the event loop
+    result = await asyncio.to_thread(
+        whatif.project,
+        summary.get("total_points", 0),
+        summary.get("total_units", 0),
+        [course.unit for course in request.courses],
+        request.target_cgpa,
+        request.max_results,
+    )
+    names = [course.name for course in request.courses]
+    for solution in result["solutions"]:
+        solution["grades"] = dict(zip(names, solution["grades"]))
+    return result
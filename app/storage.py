@@ -0,0 +1,158 @@
+"""Chunked file storage for group resources, backed by GridFS.
+
+Files live in the ``resource_files`` bucket (``resource_files.files`` and
+``resource_files.chunks``) and are referenced from ``group_resources`` by
+``file_id``. Downloads are served chunk by chunk, with ``Range`` and
+``ETag`` support.
+"""
+import hashlib
+import os
+import re
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from .database import async_db
+
+BUCKET_NAME = "resource_files"
+CHUNK_SIZE_BYTES = 255 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+
+_bucket = None
+
+
+def get_bucket() -> AsyncIOMotorGridFSBucket:
+    # Created lazily so the bucket binds to the running event loop
+    global _bucket
+    if _bucket is None:
+        _bucket = AsyncIOMotorGridFSBucket(async_db, bucket_name=BUCKET_NAME, chunk_size_bytes=CHUNK_SIZE_BYTES)
+    return _bucket
+
+
+def make_etag(sha256_hex: str) -> str:
+    return f'"{sha256_hex}"'
+
+
+async def store_bytes(data: bytes, filename: str, content_type: str, metadata: dict) -> dict:
+    """Store ``data`` as a GridFS file. Returns ``{"file_id", "length", "sha256"}``."""
+    sha256 = hashlib.sha256(data).hexdigest()
+    file_id = await get_bucket().upload_from_stream(
+        filename,
+        data,
+        metadata={**metadata, "content_type": content_type, "sha256": sha256},
+    )
+    return {"file_id": file_id, "length": len(data), "sha256": sha256}
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload grows past its size limit."""
+
+
+class ChunkedUpload:
+    """Write a file to GridFS piece by piece while hashing it.
+
+    GridFS buffers at most one chunk (``CHUNK_SIZE_BYTES``) before flushing it,
+    so memory use does not depend on the size of the file.
+    """
+
+    def __init__(self, grid_in, max_bytes: int):
+        self._grid_in = grid_in
+        self._sha256 = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.length = 0
+
+    @property
+    def file_id(self):
+        return self._grid_in._id
+
+    async def write(self, data: bytes):
+        self.length += len(data)
+        if self.length > self.max_bytes:
+            raise UploadTooLarge()
+        self._sha256.update(data)
+        await self._grid_in.write(data)
+
+    async def close(self) -> dict:
+        sha256 = self._sha256.hexdigest()
+        await self._grid_in.set("sha256", sha256)
+        await self._grid_in.close()
+        return {"file_id": self.file_id, "length": self.length, "sha256": sha256}
+
+    async def abort(self):
+        await self._grid_in.abort()
+
+
+def open_upload(filename: str, content_type: str, metadata: dict, max_bytes: int = MAX_UPLOAD_BYTES) -> ChunkedUpload:
+    grid_in = get_bucket().open_upload_stream(
+        filename,
+        metadata={**metadata, "content_type": content_type},
+    )
+    return ChunkedUpload(grid_in, max_bytes)
+
+
+async def delete_file(file_id):
+    await get_bucket().delete(file_id)
+
+
+async def delete_group_files(group_id: str) -> int:
+    """Remove every stored file that belongs to ``group_id``."""
+    bucket = get_bucket()
+    files = async_db[f"{BUCKET_NAME}.files"].find({"metadata.group_id": group_id}, {"_id": 1})
+    deleted = 0
+    async for file_doc in files:
+        await bucket.delete(file_doc["_id"])
+        deleted += 1
+    return deleted
+
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int):
+    """Parse a single-range ``Range`` header into inclusive ``(start, end)``.
+
+    Returns ``None`` when the header should be ignored and the whole file
+    served (absent, malformed, multi-range, or ``first > last``, which RFC 9110
+    treats as invalid rather than unsatisfiable) and raises ``ValueError`` when
+    the range is valid but unsatisfiable (starts at or past the end).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+async def iter_file(file_id, start: int = 0, end: int = None):
+    """Yield the bytes ``start..end`` (inclusive) of a stored file, one chunk at a time."""
+    grid_out = await get_bucket().open_download_stream(file_id)
+    if end is None:
+        end = grid_out.length - 1
+    if start:
+        grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.read(min(remaining, grid_out.chunk_size))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def iter_bytes(data: bytes, start: int = 0, end: int = None):
+    """Serve an in-memory payload with the same chunking as ``iter_file``."""
+    if end is None:
+        end = len(data) - 1
+    for offset in range(start, end + 1, CHUNK_SIZE_BYTES):
+        yield data[offset:min(offset + CHUNK_SIZE_BYTES, end + 1)]
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.encoders import jsonable_encoder
 from .schemas import (
     StudyGroupCreate, StudyGroupResponse, StudyGroupJoin,
     DiscussionMessageCreate, DiscussionMessageResponse,
@@ -6,15 +7,25 @@ from .schemas import (
     GroupTimetableEventCreate, GroupTimetableEventResponse,
     StudyGroupMemberResponse
 )
-from .database import db
-from .dependencies import get_current_user
+from .database import async_db
+from .dependencies import (
+    get_current_user, get_group_access, get_readable_group, invalidate_cached_group,
+    load_user_from_token, resolve_group_access
+)
+from .broker import broker, SubscriptionClosed
+from .activity import activity_buffer
+from .ingest import ACK_ACCEPTED, ACK_HEADER, ACK_PERSISTED, IngestBusy, IngestFailed, message_ingest
+from .pagination import decode_cursor, fetch_page, keyset_filter
+from . import jobs, projections, repository, storage, uploads
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from typing import List, Optional
 from datetime import datetime, timezone
+import asyncio
 import secrets
 import string
 import base64
-import os
+import hashlib
 from fastapi.responses import StreamingResponse
 
 router = APIRouter(
@@ -22,6 +33,18 @@ router = APIRouter(
     tags=["Study Groups"]
 )
 
+GROUP_CLEANUP_JOB = "group_cleanup"
+# Soft-deleted groups wait for their cleanup job with is_active = False
+ACTIVE_GROUP = {"is_active": {"$ne": False}}
+
+# Keyset sort orders for the paginated listings
+MEMBERS_SORT = [("_id", 1)]
+MESSAGES_OLDER_SORT = [("created_at", -1), ("_id", -1)]
+MESSAGES_NEWER_SORT = [("created_at", 1), ("_id", 1)]
+# created_at never changes, so a group cannot move across a client's cursor
+# between pages (last_activity does, on every message)
+GROUPS_SORT = [("created_at", -1), ("_id", -1)]
+
 def generate_access_code() -> str:
     """Generate a unique 6-character access code for private groups"""
     return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
@@ -35,9 +58,16 @@ def get_user_initials(full_name: str) -> str:
         return names[0][:2].upper()
     return (names[0][0] + names[-1][0]).upper()
 
-def sanitize_group_for_user(group_doc: dict, user_id: str) -> dict:
-    """Return a safe-to-send copy of group for the given user."""
+def sanitize_group_for_user(group_doc: dict, user_id: str, is_member: bool = False, members: Optional[list] = None) -> dict:
+    """Return a safe-to-send copy of group for the given user.
+
+    ``members`` is the full member id list (group detail only). Without it the
+    deprecated ``members`` field carries just the caller's own id, so older
+    clients checking ``members.includes(me)`` keep working in listings.
+    """
     safe_group = dict(group_doc)
+    safe_group["is_member"] = is_member
+    safe_group["members"] = members if members is not None else ([user_id] if is_member else [])
     # convert id to string for clients
     if isinstance(safe_group.get("_id"), ObjectId):
         safe_group["_id"] = str(safe_group["_id"])
@@ -46,16 +76,20 @@ def sanitize_group_for_user(group_doc: dict, user_id: str) -> dict:
         safe_group["access_code"] = None
     return safe_group
 
+async def is_member(group_id: str, user_id: str) -> bool:
+    """Point lookup on the unique (group_id, user_id) index of group_members."""
+    record = await async_db.group_members.find_one({"group_id": group_id, "user_id": user_id}, {"_id": 1})
+    return record is not None
+
 # Study Group CRUD Operations
 @router.post("/", response_model=StudyGroupResponse)
-def create_study_group(
+async def create_study_group(
     group: StudyGroupCreate,
     user=Depends(get_current_user)
 ):
     """Create a new study group"""
     group_doc = group.dict()
     group_doc["creator_id"] = str(user["_id"])
-    group_doc["members"] = [str(user["_id"])]
     group_doc["member_count"] = 1
     now_utc = datetime.now(timezone.utc)
     group_doc["created_at"] = now_utc
@@ -67,7 +101,7 @@ def create_study_group(
         group_doc["access_code"] = generate_access_code()
     
     group_doc["_id"] = ObjectId()
-    db.study_groups.insert_one(group_doc)
+    await async_db.study_groups.insert_one(group_doc)
     
     # Create creator membership record
     member_doc = {
@@ -77,113 +111,132 @@ def create_study_group(
         "role": "creator",
         "joined_at": datetime.utcnow()
     }
-    db.group_members.insert_one(member_doc)
+    await async_db.group_members.insert_one(member_doc)
     
-    safe = sanitize_group_for_user(group_doc, str(user["_id"]))
+    safe = sanitize_group_for_user(group_doc, str(user["_id"]), is_member=True)
     return StudyGroupResponse(**safe)
 
 @router.get("/", response_model=List[StudyGroupResponse])
-def get_study_groups(
+async def get_study_groups(
+    response: Response,
     course: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     user=Depends(get_current_user)
 ):
-    """Get all study groups (public ones + user's private groups)"""
-    # Build query for public groups or groups user is a member of
+    """Get study groups (user's groups + public ones), newest first.
+
+    Paginated: pass the X-Next-Cursor header of a page as ``cursor`` for the next one.
+    """
     user_id = str(user["_id"])
     
-    # Get groups where user is a member
-    user_groups = list(db.study_groups.find({
-        "members": user_id
-    }))
-    
-    # Get public groups where user is not already a member
+    # Groups the user is a member of, or public groups (optionally for one course)
     public_groups_query = {"is_private": False}
     if course:
         public_groups_query["course"] = course
+    memberships = await async_db.group_members.find({"user_id": user_id}, {"group_id": 1}).to_list(length=None)
+    member_of = {m["group_id"] for m in memberships}
+    my_groups_query = {"_id": {"$in": [ObjectId(gid) for gid in member_of if ObjectId.is_valid(gid)]}}
+    query = {"$or": [my_groups_query, public_groups_query], **ACTIVE_GROUP}
+    if cursor:
+        try:
+            query = {"$and": [query, keyset_filter(GROUPS_SORT, decode_cursor(cursor, GROUPS_SORT))]}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    public_groups = list(db.study_groups.find(public_groups_query))
-    
-    # Combine and deduplicate
-    all_groups = {str(g["_id"]): g for g in user_groups}
-    for group in public_groups:
-        group_id = str(group["_id"])
-        if group_id not in all_groups:
-            all_groups[group_id] = group
+    groups = await fetch_page(
+        async_db.study_groups.find(query, projections.STUDY_GROUP_LIST).sort(GROUPS_SORT), GROUPS_SORT, limit, response
+    )
     
     # Convert to response format with sanitization
     result = []
-    for group in all_groups.values():
-        safe = sanitize_group_for_user(group, user_id)
+    for group in groups:
+        safe = sanitize_group_for_user(group, user_id, is_member=str(group["_id"]) in member_of)
         result.append(StudyGroupResponse(**safe))
     return result
 
 @router.get("/{group_id}", response_model=StudyGroupResponse)
-def get_study_group(
+async def get_study_group(
     group_id: str,
-    user=Depends(get_current_user)
+    access=Depends(get_readable_group)
 ):
     """Get a specific study group"""
+    group = await async_db.study_groups.find_one({"_id": ObjectId(group_id)}, projections.STUDY_GROUP_LIST)
+    if not group:
+        raise HTTPException(status_code=404, detail="Study group not found")
+    
+    # Bounded by max_members, so the detail view still lists every member id
+    records = async_db.group_members.find({"group_id": group_id}, {"user_id": 1}).sort(MEMBERS_SORT)
+    members = [r["user_id"] for r in await records.to_list(length=max(group.get("max_members") or 0, 1))]
+    safe = sanitize_group_for_user(group, access["user_id"], is_member=access["is_member"], members=members)
+    return StudyGroupResponse(**safe)
+
+async def add_member(match: dict, user_id: str, conditions: Optional[dict] = None):
+    """Add ``user_id`` to the group matching ``match``.
+
+    A seat is reserved with one conditional update (member_count < max_members),
+    so concurrent joins cannot overfill a group; the membership record is then
+    inserted, and the unique (group_id, user_id) index turns a repeated join into
+    a DuplicateKeyError that hands the seat back. Returns ``(joined, group)`` like
+    ``repository.update_if``, with ``group["is_member"]`` set on refusals.
+    """
+    now_utc = datetime.now(timezone.utc)
+    joined, group = await repository.update_if(
+        async_db.study_groups,
+        {**match, **ACTIVE_GROUP},
+        {"$expr": {"$lt": ["$member_count", "$max_members"]}, **(conditions or {})},
+        {"$inc": {"member_count": 1}, "$set": {"last_activity": now_utc}},
+        projection={"_id": 1},
+        explain_projection={"member_count": 1, "max_members": 1, "is_private": 1}
+    )
+    if not joined:
+        if group:
+            group["is_member"] = await is_member(str(group["_id"]), user_id)
+        return None, group
+    
     try:
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
-        # Check if user has access to private groups
-        user_id = str(user["_id"])
-        if group["is_private"] and user_id not in group["members"]:
-            raise HTTPException(status_code=403, detail="Access denied to private group")
-        
-        safe = sanitize_group_for_user(group, str(user["_id"]))
-        return StudyGroupResponse(**safe)
+        await async_db.group_members.insert_one({
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "group_id": str(joined["_id"]),
+            "role": "member",
+            "joined_at": now_utc
+        })
     except Exception as e:
-        raise HTTPException(status_code=400, detail="Invalid group ID")
+        await async_db.study_groups.update_one({"_id": joined["_id"]}, {"$inc": {"member_count": -1}})
+        if isinstance(e, DuplicateKeyError):
+            invalidate_cached_group(str(joined["_id"]), user_id)
+            return None, {"_id": joined["_id"], "is_member": True}
+        raise
+    invalidate_cached_group(str(joined["_id"]), user_id)
+    return joined, group
+
+def join_refusal(group: Optional[dict]) -> HTTPException:
+    """Explain why ``add_member`` refused a join, given the group as it stands."""
+    if not group:
+        return HTTPException(status_code=404, detail="Study group not found")
+    if group.get("is_member"):
+        return HTTPException(status_code=400, detail="Already a member of this group")
+    if group.get("member_count", 0) >= group.get("max_members", 0):
+        return HTTPException(status_code=400, detail="Group is at maximum capacity")
+    return HTTPException(status_code=403, detail="Invalid access code")
 
 @router.post("/{group_id}/join")
-def join_study_group(
+async def join_study_group(
     group_id: str,
     join_data: StudyGroupJoin,
     user=Depends(get_current_user)
 ):
     """Join a study group"""
     try:
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
+        # Private groups only admit callers holding the right access code
+        access = [{"is_private": {"$ne": True}}]
+        if join_data.access_code:
+            access.append({"access_code": join_data.access_code})
         
-        user_id = str(user["_id"])
-        
-        # Check if user is already a member
-        if user_id in group["members"]:
-            raise HTTPException(status_code=400, detail="Already a member of this group")
-        
-        # Check group capacity
-        if len(group["members"]) >= group["max_members"]:
-            raise HTTPException(status_code=400, detail="Group is at maximum capacity")
-        
-        # Check access code for private groups
-        if group["is_private"]:
-            if not join_data.access_code or join_data.access_code != group["access_code"]:
-                raise HTTPException(status_code=403, detail="Invalid access code")
-        
-        # Add user to group
-        db.study_groups.update_one(
-            {"_id": ObjectId(group_id)},
-            {
-                "$push": {"members": user_id},
-                "$inc": {"member_count": 1},
-                "$set": {"last_activity": datetime.now(timezone.utc)}
-            }
-        )
-        
-        # Create membership record
-        member_doc = {
-            "_id": ObjectId(),
-            "user_id": user_id,
-            "group_id": group_id,
-            "role": "member",
-            "joined_at": datetime.now(timezone.utc)
-        }
-        db.group_members.insert_one(member_doc)
+        joined, group = await add_member({"_id": ObjectId(group_id)}, str(user["_id"]), {"$or": access})
+        if not joined:
+            raise join_refusal(group)
         
         return {"message": "Successfully joined the group"}
     except Exception as e:
@@ -192,7 +245,7 @@ def join_study_group(
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
 @router.post("/join-by-code")
-def join_study_group_by_code(
+async def join_study_group_by_code(
     join_data: StudyGroupJoin,
     user=Depends(get_current_user)
 ):
@@ -200,67 +253,64 @@ def join_study_group_by_code(
     if not join_data.access_code:
         raise HTTPException(status_code=400, detail="Access code is required")
     
-    # Find group by access code
-    group = db.study_groups.find_one({"access_code": join_data.access_code})
+    joined, group = await add_member({"access_code": join_data.access_code}, str(user["_id"]))
+    if joined:
+        return {"message": "Successfully joined the group", "group_id": str(joined["_id"])}
     if not group:
         raise HTTPException(status_code=404, detail="Study group not found for this access code")
+    if group.get("is_member"):
+        return {"message": "Already a member of this group", "group_id": str(group["_id"])}
+    raise join_refusal(group)
 
-    group_id = str(group["_id"])
-    user_id = str(user["_id"])
-
-    # Already a member
-    if user_id in group.get("members", []):
-        return {"message": "Already a member of this group", "group_id": group_id}
-
-    # Capacity check
-    if len(group.get("members", [])) >= group.get("max_members", 0):
-        raise HTTPException(status_code=400, detail="Group is at maximum capacity")
+async def retire_group(group_id: str):
+    """Soft-delete a group now and leave removing its data to a background job.
 
-    # Add user to group
-    db.study_groups.update_one(
+    The job is enqueued first: if that fails the group stays visible and the
+    delete can simply be retried, instead of leaving a hidden group that no
+    job will ever clean up.
+    """
+    await jobs.job_queue.enqueue(GROUP_CLEANUP_JOB, {"group_id": group_id})
+    await async_db.study_groups.update_one(
         {"_id": ObjectId(group_id)},
-        {
-            "$push": {"members": user_id},
-            "$inc": {"member_count": 1},
-            "$set": {"last_activity": datetime.utcnow()}
-        }
+        {"$set": {"is_active": False, "deleted_at": datetime.now(timezone.utc)}}
     )
+    invalidate_cached_group(group_id)
+    broker.close_channel(group_id, "group deleted")
 
-    # Create membership record
-    member_doc = {
-        "_id": ObjectId(),
-        "user_id": user_id,
-        "group_id": group_id,
-        "role": "member",
-        "joined_at": datetime.utcnow()
-    }
-    db.group_members.insert_one(member_doc)
-
-    return {"message": "Successfully joined the group", "group_id": group_id}
+@jobs.job_queue.handler(GROUP_CLEANUP_JOB)
+async def cleanup_group(payload: dict):
+    """Remove a soft-deleted group's data in bounded batches, then the group itself."""
+    group_id = payload["group_id"]
+    group = await async_db.study_groups.find_one({"_id": ObjectId(group_id)}, {"is_active": 1})
+    if group is not None and group.get("is_active") is not False:
+        # Enqueued ahead of the soft delete, which has not landed (yet); retry later
+        raise RuntimeError(f"Group {group_id} is still active")
+    await storage.delete_group_files(group_id)
+    for collection in (
+        async_db.group_members,
+        async_db.discussion_messages,
+        async_db.group_resources,
+        async_db.group_timetable_events,
+    ):
+        await jobs.delete_in_batches(collection, {"group_id": group_id})
+    await async_db.study_groups.delete_one({"_id": ObjectId(group_id), "is_active": False})
 
 @router.delete("/{group_id}")
-def delete_study_group(
+async def delete_study_group(
     group_id: str,
     user=Depends(get_current_user)
 ):
-    """Delete a study group. Only the creator can delete the group."""
+    """Delete a study group. Only the creator can delete the group.
+
+    The group disappears immediately; its members, messages, resources and
+    events are removed in the background.
+    """
     try:
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
-        user_id = str(user["_id"])
-        if group.get("creator_id") != user_id:
+        access = await resolve_group_access(group_id, str(user["_id"]))
+        if access["creator_id"] != access["user_id"]:
             raise HTTPException(status_code=403, detail="Only the group creator can delete this group")
         
-        # Delete the group
-        db.study_groups.delete_one({"_id": ObjectId(group_id)})
-        # Cascade delete related data
-        db.group_members.delete_many({"group_id": group_id})
-        db.discussion_messages.delete_many({"group_id": group_id})
-        db.group_resources.delete_many({"group_id": group_id})
-        db.group_timetable_events.delete_many({"group_id": group_id})
-        
+        await retire_group(group_id)
         return {"message": "Group deleted"}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -268,52 +318,47 @@ def delete_study_group(
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
 @router.post("/{group_id}/leave")
-def leave_study_group(
+async def leave_study_group(
     group_id: str,
     user=Depends(get_current_user)
 ):
     """Leave a study group"""
     try:
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
+        group_oid = ObjectId(group_id)
         user_id = str(user["_id"])
         
-        # Check if user is a member
-        if user_id not in group["members"]:
+        membership = await async_db.group_members.find_one_and_delete({"group_id": group_id, "user_id": user_id})
+        invalidate_cached_group(group_id, user_id)
+        if not membership:
+            if not await async_db.study_groups.find_one({"_id": group_oid}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Study group not found")
             raise HTTPException(status_code=400, detail="Not a member of this group")
         
-        # Prevent creator from leaving if there are other members
-        if group["creator_id"] == user_id and len(group["members"]) > 1:
-            raise HTTPException(
-                status_code=400, 
-                detail="Group creator cannot leave while there are other members. Transfer ownership first."
-            )
-        
-        # Remove user from group
-        db.study_groups.update_one(
-            {"_id": ObjectId(group_id)},
+        # The creator may only leave as the last member
+        left, group = await repository.update_if(
+            async_db.study_groups,
+            {"_id": group_oid},
+            {"$or": [{"creator_id": {"$ne": user_id}}, {"member_count": {"$lte": 1}}]},
             {
-                "$pull": {"members": user_id},
                 "$inc": {"member_count": -1},
                 "$set": {"last_activity": datetime.now(timezone.utc)}
-            }
+            },
+            projection={"creator_id": 1}
         )
+        if not left:
+            # Put the membership back; the group is unchanged
+            await async_db.group_members.insert_one(membership)
+            invalidate_cached_group(group_id, user_id)
+            if not group:
+                raise HTTPException(status_code=404, detail="Study group not found")
+            raise HTTPException(
+                status_code=400, 
+                detail="Group creator cannot leave while there are other members. Transfer ownership first."
+            )
         
-        # Remove membership record
-        db.group_members.delete_one({
-            "user_id": user_id,
-            "group_id": group_id
-        })
-        
-        # If creator left and no other members, delete the group
-        if group["creator_id"] == user_id and len(group["members"]) == 1:
-            db.study_groups.delete_one({"_id": ObjectId(group_id)})
-            # Clean up related data
-            db.discussion_messages.delete_many({"group_id": group_id})
-            db.group_resources.delete_many({"group_id": group_id})
-            db.group_timetable_events.delete_many({"group_id": group_id})
+        # If the creator left they were the last member, so delete the group
+        if left["creator_id"] == user_id:
+            await retire_group(group_id)
             return {"message": "Left group and group was deleted"}
         
         return {"message": "Successfully left the group"}
@@ -322,28 +367,36 @@ def leave_study_group(
             raise e
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
-@router.get("/{group_id}/members", response_model=List[StudyGroupMemberResponse])
-def get_group_members(
+@router.get("/{group_id}/members", response_model=List[StudyGroupMemberResponse], dependencies=[Depends(get_readable_group)])
+async def get_group_members(
     group_id: str,
-    user=Depends(get_current_user)
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None
 ):
-    """Get all members of a study group"""
+    """Get members of a study group, one page at a time (next page cursor in X-Next-Cursor)"""
     try:
-        # Verify user has access to the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
-        user_id = str(user["_id"])
-        if group["is_private"] and user_id not in group["members"]:
-            raise HTTPException(status_code=403, detail="Access denied to private group")
+        # Get one page of member records
+        query = {"group_id": group_id}
+        if cursor:
+            try:
+                query.update(keyset_filter(MEMBERS_SORT, decode_cursor(cursor, MEMBERS_SORT)))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        members = await fetch_page(
+            async_db.group_members.find(query, projections.GROUP_MEMBER_LIST).sort(MEMBERS_SORT), MEMBERS_SORT, limit, response
+        )
         
-        # Get member details
-        members = list(db.group_members.find({"group_id": group_id}))
+        # Enrich with user information in a single batched lookup
+        user_ids = [ObjectId(m["user_id"]) for m in members if ObjectId.is_valid(m["user_id"])]
+        users = await async_db.users.find(
+            {"_id": {"$in": user_ids}},
+            {"username": 1, "full_name": 1}
+        ).to_list(length=None)
+        users_by_id = {str(u["_id"]): u for u in users}
         
-        # Enrich with user information
         for member in members:
-            user_info = db.users.find_one({"_id": ObjectId(member["user_id"])})
+            user_info = users_by_id.get(member["user_id"])
             if user_info:
                 member["user_info"] = {
                     "username": user_info.get("username", ""),
@@ -359,136 +412,342 @@ def get_group_members(
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
 # Discussion endpoints
+async def announce_message(doc: dict):
+    """Bump the group's activity and push a stored message to its subscribers."""
+    await activity_buffer.record(doc["group_id"])
+    response_message = DiscussionMessageResponse(**dict(doc, _id=str(doc["_id"])))
+    await broker.publish(doc["group_id"], jsonable_encoder(response_message))
+    return response_message
+
+@message_ingest.after_persist
+async def announce_ingested_messages(docs: list):
+    for doc in docs:
+        await announce_message(doc)
+
 @router.post("/{group_id}/discussions", response_model=DiscussionMessageResponse)
-def create_discussion_message(
+async def create_discussion_message(
     group_id: str,
     message: DiscussionMessageCreate,
+    response: Response,
+    ack: str = Query(ACK_PERSISTED, pattern=f"^({ACK_ACCEPTED}|{ACK_PERSISTED})$"),
+    access=Depends(get_group_access),
     user=Depends(get_current_user)
 ):
-    """Create a new discussion message"""
+    """Create a new discussion message.
+
+    With batched ingest enabled, ``ack=accepted`` answers 202 once the message is
+    queued; ``ack=persisted`` (default) answers once it is stored. Without it every
+    message is stored before the answer. ``X-Message-Ack`` says which one applied.
+    """
     try:
-        # Verify user is a member of the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
         user_id = str(user["_id"])
-        if user_id not in group["members"]:
+        if not access["is_member"]:
             raise HTTPException(status_code=403, detail="Must be a group member to post messages")
         
         message_doc = message.dict()
+        message_doc["group_id"] = group_id
         message_doc["user_id"] = user_id
         message_doc["user_name"] = user.get("full_name", user.get("username", "Unknown"))
         message_doc["user_initials"] = get_user_initials(user.get("full_name", ""))
         message_doc["created_at"] = datetime.now(timezone.utc)
         message_doc["_id"] = ObjectId()
         
-        db.discussion_messages.insert_one(message_doc)
-        
-        # Update group last activity
-        db.study_groups.update_one(
-            {"_id": ObjectId(group_id)},
-            {"$set": {"last_activity": datetime.now(timezone.utc)}}
-        )
-        
-        message_doc["_id"] = str(message_doc["_id"])
-        return DiscussionMessageResponse(**message_doc)
+        if message_ingest.enabled:
+            try:
+                await message_ingest.submit(message_doc, ack)
+            except IngestBusy:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many messages right now. Please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            except IngestFailed:
+                raise HTTPException(status_code=503, detail="The message could not be saved. Please retry.")
+            if ack == ACK_ACCEPTED:
+                response.status_code = 202
+            response.headers[ACK_HEADER] = ack
+            # The ingest writer announces the message once it is stored
+            return DiscussionMessageResponse(**dict(message_doc, _id=str(message_doc["_id"])))
+        
+        await async_db.discussion_messages.insert_one(message_doc)
+        response.headers[ACK_HEADER] = ACK_PERSISTED
+        return await announce_message(message_doc)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
-@router.get("/{group_id}/discussions", response_model=List[DiscussionMessageResponse])
-def get_discussion_messages(
+async def resolve_message_bound(group_id: str, value: str, sort: list) -> dict:
+    """Turn a ``before``/``after`` value into keyset values for ``sort``.
+
+    Accepts a cursor from X-Next-Cursor, a message ObjectId or an ISO timestamp.
+    """
+    if ObjectId.is_valid(value):
+        anchor = await async_db.discussion_messages.find_one(
+            {"_id": ObjectId(value), "group_id": group_id},
+            {"created_at": 1}
+        )
+        if not anchor:
+            raise HTTPException(status_code=400, detail="Unknown message cursor")
+        return anchor
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        timestamp = None
+    if timestamp is not None:
+        # No tie-breaker for a bare timestamp: pick the _id that sorts before every
+        # message at that instant, so the bound is exclusive in both directions
+        return {"created_at": timestamp, "_id": ObjectId("0" * 24) if sort[0][1] < 0 else ObjectId("f" * 24)}
+    try:
+        return decode_cursor(value, sort)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/{group_id}/discussions", response_model=List[DiscussionMessageResponse], dependencies=[Depends(get_readable_group)])
+async def get_discussion_messages(
     group_id: str,
-    limit: int = 50,
-    user=Depends(get_current_user)
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None
 ):
-    """Get discussion messages for a group"""
+    """Get discussion messages for a group, oldest first.
+
+    Without ``before``/``after`` this returns the latest page. ``before`` pages
+    back through history and ``after`` fetches newer messages; both take a
+    message id, an ISO timestamp or the X-Next-Cursor of the previous page.
+    """
     try:
-        # Verify user has access to the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
+        if before and after:
+            raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
         
-        user_id = str(user["_id"])
-        if group["is_private"] and user_id not in group["members"]:
-            raise HTTPException(status_code=403, detail="Access denied to private group")
+        sort = MESSAGES_NEWER_SORT if after else MESSAGES_OLDER_SORT
+        query = {"group_id": group_id}
+        bound = before or after
+        if bound:
+            query.update(keyset_filter(sort, await resolve_message_bound(group_id, bound, sort)))
         
-        messages = list(db.discussion_messages.find(
-            {"group_id": group_id}
-        ).sort("created_at", -1).limit(limit))
+        messages = await fetch_page(
+            async_db.discussion_messages.find(query, projections.DISCUSSION_MESSAGE_LIST).sort(sort), sort, limit, response
+        )
         
         for message in messages:
             message["_id"] = str(message["_id"])
         
-        return [DiscussionMessageResponse(**message) for message in reversed(messages)]
+        if not after:
+            messages.reverse()
+        return [DiscussionMessageResponse(**message) for message in messages]
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
+@router.websocket("/{group_id}/discussions/ws")
+async def discussion_socket(
+    websocket: WebSocket,
+    group_id: str,
+    token: str
+):
+    """Push new discussion messages for a group as they are posted.
+
+    Browsers cannot set headers on WebSockets, so the access token is passed
+    as the ``token`` query parameter. Each message is sent as a JSON text
+    frame shaped like DiscussionMessageResponse. If the client falls too far
+    behind the socket is closed with code 1013; reconnect and fetch the gap
+    with ``GET /{group_id}/discussions?after=<last message id>``.
+    """
+    try:
+        user = await load_user_from_token(token)
+        access = await resolve_group_access(group_id, str(user["_id"]))
+        allowed = not access["is_private"] or access["is_member"]
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if not allowed:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    subscription = broker.subscribe(group_id)
+    
+    async def forward_messages():
+        while True:
+            await websocket.send_json(await subscription.get())
+    
+    async def wait_for_disconnect():
+        # Incoming frames are ignored; this only notices the client leaving
+        while True:
+            if (await websocket.receive())["type"] == "websocket.disconnect":
+                return
+    
+    sender = asyncio.create_task(forward_messages())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if sender in done and isinstance(sender.exception(), SubscriptionClosed):
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=sender.exception().reason)
+    except Exception:
+        pass
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        subscription.close()
+
 # Resource endpoints
+async def save_resource_record(
+    group_id: str,
+    resource_id: ObjectId,
+    user: dict,
+    name: str,
+    description: Optional[str],
+    file_type: str,
+    stored: dict
+) -> dict:
+    """Insert the group_resources document for an already stored file."""
+    resource_doc = {
+        "_id": resource_id,
+        "name": name,
+        "description": description,
+        "file_type": file_type,
+        "group_id": group_id,
+        "file_id": stored["file_id"],
+        "file_size": stored["length"],
+        "sha256": stored["sha256"],
+        "uploaded_by": str(user["_id"]),
+        "uploader_name": user.get("full_name", user.get("username", "Unknown")),
+        "uploaded_at": datetime.now(timezone.utc),
+        "download_url": f"/study-groups/{group_id}/resources/{str(resource_id)}/download",
+    }
+    try:
+        await async_db.group_resources.insert_one(resource_doc)
+    except Exception:
+        # Do not leave an orphaned file behind
+        await storage.delete_file(stored["file_id"])
+        raise
+    
+    # Update group last activity (buffered, see activity.py)
+    await activity_buffer.record(group_id)
+    
+    resource_doc["_id"] = str(resource_doc["_id"])
+    return resource_doc
+
 @router.post("/{group_id}/resources", response_model=GroupResourceResponse)
-def upload_group_resource(
+async def upload_group_resource(
     group_id: str,
     resource: GroupResourceCreate,
+    access=Depends(get_group_access),
     user=Depends(get_current_user)
 ):
-    """Upload a resource to a study group"""
+    """Upload a base64-encoded resource to a study group"""
     try:
-        # Verify user is a member of the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
-        user_id = str(user["_id"])
-        if user_id not in group["members"]:
+        if not access["is_member"]:
             raise HTTPException(status_code=403, detail="Must be a group member to upload resources")
         
-        # Keep base64 content to enable downloads (for demo; consider cloud storage in prod)
-        resource_doc = resource.dict()
-        resource_doc["file_base64"] = resource_doc.pop("file_content")
-        resource_doc["uploaded_by"] = user_id
-        resource_doc["uploader_name"] = user.get("full_name", user.get("username", "Unknown"))
-        resource_doc["uploaded_at"] = datetime.now(timezone.utc)
-        resource_doc["_id"] = ObjectId()
-        resource_doc["download_url"] = f"/study-groups/{group_id}/resources/{str(resource_doc['_id'])}/download"
-        
-        db.group_resources.insert_one(resource_doc)
-        
-        # Update group last activity
-        db.study_groups.update_one(
-            {"_id": ObjectId(group_id)},
-            {"$set": {"last_activity": datetime.now(timezone.utc)}}
+        # Decode once and store the bytes in chunked storage, not in the document.
+        # Line-wrapped base64 (MIME style, 76 columns) is still accepted
+        file_bytes = base64.b64decode("".join(resource.file_content.split()), validate=True)
+        if len(file_bytes) > storage.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File is too large")
+        resource_id = ObjectId()
+        stored = await storage.store_bytes(
+            file_bytes,
+            filename=resource.name,
+            content_type=resource.file_type,
+            metadata={"group_id": group_id, "resource_id": str(resource_id)},
+        )
+        resource_doc = await save_resource_record(
+            group_id, resource_id, user, resource.name, resource.description, resource.file_type, stored
         )
-        
-        resource_doc["_id"] = str(resource_doc["_id"])
         return GroupResourceResponse(**resource_doc)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=400, detail="Invalid group ID or file data")
 
-@router.get("/{group_id}/resources", response_model=List[GroupResourceResponse])
-def get_group_resources(
+@router.post("/{group_id}/resources/upload", response_model=GroupResourceResponse)
+async def upload_group_resource_multipart(
     group_id: str,
+    request: Request,
+    access=Depends(get_group_access),
     user=Depends(get_current_user)
+):
+    """Upload a resource as multipart/form-data, streaming the file into storage.
+
+    Form fields: ``file`` (required), ``name`` and ``description`` (optional).
+    """
+    if not access["is_member"]:
+        raise HTTPException(status_code=403, detail="Must be a group member to upload resources")
+    
+    # Reject obviously oversized bodies before reading any of them
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > storage.MAX_UPLOAD_BYTES + uploads.MAX_FIELD_BYTES:
+        raise HTTPException(status_code=413, detail="File is too large")
+    
+    try:
+        form = uploads.MultipartStream(request.headers.get("content-type"))
+    except uploads.MultipartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    resource_id = ObjectId()
+    fields = {}
+    upload = None
+    file_info = None
+    stored = None
+    try:
+        async for chunk in request.stream():
+            events = form.feed(chunk) if chunk else form.finish()
+            for event in events:
+                if event[0] == "field":
+                    fields[event[1]] = event[2]
+                elif event[0] == "file_start":
+                    if upload is not None or event[1] != "file":
+                        raise uploads.MultipartError("Send exactly one file, in the 'file' field")
+                    file_info = {"filename": event[2], "content_type": event[3]}
+                    upload = storage.open_upload(
+                        event[2],
+                        event[3],
+                        metadata={"group_id": group_id, "resource_id": str(resource_id)},
+                    )
+                elif event[0] == "file_data":
+                    await upload.write(event[1])
+                elif event[0] == "file_end":
+                    stored = await upload.close()
+        if stored is None:
+            raise uploads.MultipartError("Missing 'file' field")
+    except (uploads.MultipartError, storage.UploadTooLarge) as e:
+        if upload is not None and stored is None:
+            await upload.abort()
+        elif stored is not None:
+            await storage.delete_file(stored["file_id"])
+        if isinstance(e, storage.UploadTooLarge):
+            raise HTTPException(status_code=413, detail="File is too large")
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        if upload is not None and stored is None:
+            await upload.abort()
+        raise
+    
+    resource_doc = await save_resource_record(
+        group_id,
+        resource_id,
+        user,
+        fields.get("name") or file_info["filename"],
+        fields.get("description"),
+        file_info["content_type"],
+        stored,
+    )
+    return GroupResourceResponse(**resource_doc)
+
+@router.get("/{group_id}/resources", response_model=List[GroupResourceResponse], dependencies=[Depends(get_readable_group)])
+async def get_group_resources(
+    group_id: str
 ):
     """Get all resources for a study group"""
     try:
-        # Verify user has access to the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
-        user_id = str(user["_id"])
-        if group["is_private"] and user_id not in group["members"]:
-            raise HTTPException(status_code=403, detail="Access denied to private group")
-        
-        resources = list(db.group_resources.find(
-            {"group_id": group_id}
-        ).sort("uploaded_at", -1))
+        resources = await async_db.group_resources.find(
+            {"group_id": group_id},
+            projections.GROUP_RESOURCE_LIST
+        ).sort("uploaded_at", -1).to_list(length=None)
         
         for resource in resources:
             resource["_id"] = str(resource["_id"])
@@ -499,27 +758,68 @@ def get_group_resources(
             raise e
         raise HTTPException(status_code=400, detail="Invalid group ID")
 
-@router.get("/{group_id}/resources/{resource_id}/download")
-def download_group_resource(
+def build_download_response(request: Request, resource: dict, body_for_range, size: int, etag: str):
+    """Answer a download with conditional (ETag) and single-range support."""
+    filename = resource.get("name", "download")
+    file_type = resource.get("file_type", "application/octet-stream")
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range when the client's copy is still current
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = storage.parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(body_for_range(0, size - 1), media_type=file_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(body_for_range(start, end), status_code=206, media_type=file_type, headers=headers)
+
+@router.get("/{group_id}/resources/{resource_id}/download", dependencies=[Depends(get_readable_group)])
+async def download_group_resource(
     group_id: str,
     resource_id: str,
-    user=Depends(get_current_user)
+    request: Request
 ):
-    """Download a resource's original file content (stored as base64 for demo)."""
+    """Stream a resource's file chunk by chunk (supports Range and If-None-Match)."""
     try:
-        # Verify access
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        user_id = str(user["_id"])
-        if group["is_private"] and user_id not in group["members"]:
-            raise HTTPException(status_code=403, detail="Access denied to private group")
-
-        resource = db.group_resources.find_one({"_id": ObjectId(resource_id), "group_id": group_id})
+        resource = await async_db.group_resources.find_one(
+            {"_id": ObjectId(resource_id), "group_id": group_id},
+            projections.GROUP_RESOURCE_DOWNLOAD
+        )
         if not resource:
             raise HTTPException(status_code=404, detail="Resource not found")
 
-        file_base64 = resource.get("file_base64")
+        if resource.get("file_id"):
+            file_id = resource["file_id"]
+            return build_download_response(
+                request,
+                resource,
+                lambda start, end: storage.iter_file(file_id, start, end),
+                resource["file_size"],
+                storage.make_etag(resource["sha256"]),
+            )
+
+        # Legacy resources that have not been migrated out of the document yet
+        legacy = await async_db.group_resources.find_one({"_id": resource["_id"]}, {"file_base64": 1})
+        file_base64 = (legacy or {}).get("file_base64")
         if not file_base64:
             raise HTTPException(status_code=404, detail="File content not available")
 
@@ -528,15 +828,12 @@ def download_group_resource(
         except Exception:
             raise HTTPException(status_code=400, detail="Corrupted file data")
 
-        filename = resource.get("name", "download")
-        file_type = resource.get("file_type", "application/octet-stream")
-
-        return StreamingResponse(
-            iter([file_bytes]),
-            media_type=file_type,
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
+        return build_download_response(
+            request,
+            resource,
+            lambda start, end: storage.iter_bytes(file_bytes, start, end),
+            len(file_bytes),
+            storage.make_etag(hashlib.sha256(file_bytes).hexdigest()),
         )
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -545,20 +842,16 @@ def download_group_resource(
 
 # Group Timetable endpoints
 @router.post("/{group_id}/timetable", response_model=GroupTimetableEventResponse)
-def create_group_timetable_event(
+async def create_group_timetable_event(
     group_id: str,
     event: GroupTimetableEventCreate,
+    access=Depends(get_group_access),
     user=Depends(get_current_user)
 ):
     """Create a new group timetable event"""
     try:
-        # Verify user is a member of the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
         user_id = str(user["_id"])
-        if user_id not in group["members"]:
+        if not access["is_member"]:
             raise HTTPException(status_code=403, detail="Must be a group member to create events")
         
         event_doc = event.dict()
@@ -569,13 +862,10 @@ def create_group_timetable_event(
         event_doc["attendee_count"] = 1
         event_doc["_id"] = ObjectId()
         
-        db.group_timetable_events.insert_one(event_doc)
+        await async_db.group_timetable_events.insert_one(event_doc)
         
-        # Update group last activity
-        db.study_groups.update_one(
-            {"_id": ObjectId(group_id)},
-            {"$set": {"last_activity": datetime.now(timezone.utc)}}
-        )
+        # Update group last activity (buffered, see activity.py)
+        await activity_buffer.record(group_id)
         
         event_doc["_id"] = str(event_doc["_id"])
         return GroupTimetableEventResponse(**event_doc)
@@ -584,24 +874,14 @@ def create_group_timetable_event(
             raise e
         raise HTTPException(status_code=400, detail="Invalid group ID or event data")
 
-@router.get("/{group_id}/timetable", response_model=List[GroupTimetableEventResponse])
-def get_group_timetable_events(
+@router.get("/{group_id}/timetable", response_model=List[GroupTimetableEventResponse], dependencies=[Depends(get_readable_group)])
+async def get_group_timetable_events(
     group_id: str,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    user=Depends(get_current_user)
+    end_date: Optional[str] = None
 ):
     """Get timetable events for a study group"""
     try:
-        # Verify user has access to the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
-        user_id = str(user["_id"])
-        if group["is_private"] and user_id not in group["members"]:
-            raise HTTPException(status_code=403, detail="Access denied to private group")
-        
         query = {"group_id": group_id}
         
         # Add date filtering if provided
@@ -613,7 +893,7 @@ def get_group_timetable_events(
                 date_filter["$lte"] = datetime.fromisoformat(end_date)
             query["start_time"] = date_filter
         
-        events = list(db.group_timetable_events.find(query).sort("start_time", 1))
+        events = await async_db.group_timetable_events.find(query, projections.GROUP_TIMETABLE_EVENT_LIST).sort("start_time", 1).to_list(length=None)
         
         for event in events:
             event["_id"] = str(event["_id"])
@@ -625,39 +905,34 @@ def get_group_timetable_events(
         raise HTTPException(status_code=400, detail="Invalid group ID or date format")
 
 @router.post("/{group_id}/timetable/{event_id}/attend")
-def attend_group_event(
+async def attend_group_event(
     group_id: str,
     event_id: str,
+    access=Depends(get_group_access),
     user=Depends(get_current_user)
 ):
     """Mark attendance for a group event"""
     try:
-        # Verify user is a member of the group
-        group = db.study_groups.find_one({"_id": ObjectId(group_id)})
-        if not group:
-            raise HTTPException(status_code=404, detail="Study group not found")
-        
         user_id = str(user["_id"])
-        if user_id not in group["members"]:
+        if not access["is_member"]:
             raise HTTPException(status_code=403, detail="Must be a group member to attend events")
         
-        # Check if event exists
-        event = db.group_timetable_events.find_one({"_id": ObjectId(event_id), "group_id": group_id})
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
         # Add user to attendees if not already attending
-        if user_id not in event.get("attendees", []):
-            db.group_timetable_events.update_one(
-                {"_id": ObjectId(event_id)},
-                {
-                    "$push": {"attendees": user_id},
-                    "$inc": {"attendee_count": 1}
-                }
-            )
+        attending, event = await repository.update_if(
+            async_db.group_timetable_events,
+            {"_id": ObjectId(event_id), "group_id": group_id},
+            {"attendees": {"$ne": user_id}},
+            {
+                "$push": {"attendees": user_id},
+                "$inc": {"attendee_count": 1}
+            },
+            projection={"_id": 1}
+        )
+        if attending:
             return {"message": "Successfully marked as attending"}
-        else:
-            return {"message": "Already marked as attending"}
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
+        return {"message": "Already marked as attending"}
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -1,8 +1,16 @@
+import asyncio
+import os
 from fastapi import APIRouter, Depends, HTTPException
-from .schemas import StudyBlockCreate, StudyBlockResponse
-from .database import db
+from .schemas import (
+    StudyBlockCreate, StudyBlockResponse, AllocationRequest, AllocationResponse,
+    ConflictCheckRequest, ConflictCheckResponse, StudyBlockSync, StudyBlockSyncResponse
+)
+from .database import async_client, async_db
 from .dependencies import get_current_user
+from . import projections, repository, scheduling
 from bson import ObjectId
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import OperationFailure
 from typing import List
 
 router = APIRouter(
@@ -10,69 +18,232 @@ router = APIRouter(
     tags=["Timetable"]
 )
 
+# Upper bound on allocator CPU time per request
+ALLOCATION_TIME_BUDGET_MS = float(os.getenv("ALLOCATION_TIME_BUDGET_MS", 50))
+# Apply timetable syncs inside a transaction (needs a replica set; falls back otherwise)
+SYNC_TRANSACTIONS = os.getenv("TIMETABLE_SYNC_TRANSACTIONS", "true").lower() == "true"
+
+BLOCK_FIELDS = tuple(StudyBlockCreate.__fields__)
+
+async def check_conflicts(
+    user_id: str,
+    blocks: list,
+    include_existing: bool = True,
+    ignore_block_ids=()
+) -> dict:
+    """Overlaps among ``blocks`` (dicts) and, optionally, with the user's stored blocks."""
+    existing = []
+    if include_existing:
+        ignored = [ObjectId(bid) for bid in ignore_block_ids if ObjectId.is_valid(bid)]
+        existing = await async_db.study_blocks.find(
+            {"user_id": user_id, "_id": {"$nin": ignored}},
+            {"title": 1, "day": 1, "startTime": 1, "endTime": 1}
+        ).to_list(length=None)
+    
+    combined = list(blocks) + existing
+    conflicts, invalid = scheduling.find_conflicts(combined, only_involving=set(range(len(blocks))))
+    
+    def ref(index: int) -> dict:
+        block = combined[index]
+        if index < len(blocks):
+            info = {"source": "submitted", "index": index}
+        else:
+            info = {"source": "existing", "id": str(block["_id"])}
+        info.update({key: block.get(key) for key in ("title", "day", "startTime", "endTime")})
+        return info
+    
+    return {
+        "conflicts": [
+            {
+                "first": ref(i),
+                "second": ref(j),
+                "day": day,
+                "overlap_start": scheduling.format_time(start),
+                "overlap_end": scheduling.format_time(end),
+                "overlap_minutes": end - start,
+            }
+            for i, j, day, start, end in conflicts
+        ],
+        "invalid": [ref(i) for i in invalid if i < len(blocks)],
+    }
+
+def raise_on_conflicts(report: dict):
+    if report["conflicts"] or report["invalid"]:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Study blocks overlap or have invalid times", **report}
+        )
+
+@router.post("/blocks/conflicts", response_model=ConflictCheckResponse)
+async def check_study_block_conflicts(
+    request: ConflictCheckRequest,
+    user=Depends(get_current_user)
+):
+    """Report every overlap in a proposed set of blocks (and with the stored timetable)"""
+    return await check_conflicts(
+        str(user["_id"]),
+        [block.dict() for block in request.blocks],
+        include_existing=request.include_existing,
+        ignore_block_ids=request.ignore_block_ids,
+    )
+
 @router.post("/blocks", response_model=StudyBlockResponse)
-def create_study_block(
+async def create_study_block(
     block: StudyBlockCreate,
+    reject_conflicts: bool = False,
     user=Depends(get_current_user)
 ):
-    """Create a new study block"""
+    """Create a new study block (with reject_conflicts=true, 409 if it overlaps another)"""
+    if reject_conflicts:
+        raise_on_conflicts(await check_conflicts(str(user["_id"]), [block.dict()]))
     block_doc = block.dict()
     block_doc["user_id"] = str(user["_id"])
     block_doc["_id"] = ObjectId()
-    db.study_blocks.insert_one(block_doc)
+    await async_db.study_blocks.insert_one(block_doc)
     block_doc["_id"] = str(block_doc["_id"])
     return StudyBlockResponse(**block_doc)
 
 @router.get("/blocks", response_model=List[StudyBlockResponse])
-def get_study_blocks(
+async def get_study_blocks(
     user=Depends(get_current_user)
 ):
     """Get all study blocks for the current user"""
-    blocks = list(db.study_blocks.find({"user_id": str(user["_id"])}))
+    blocks = await async_db.study_blocks.find({"user_id": str(user["_id"])}, projections.STUDY_BLOCK_LIST).to_list(length=None)
     for block in blocks:
         block["_id"] = str(block["_id"])
     return [StudyBlockResponse(**block) for block in blocks]
 
+def diff_blocks(user_id: str, submitted: list, stored: list) -> tuple:
+    """Work out the writes that turn ``stored`` into ``submitted``.
+
+    Submitted blocks that carry the id of a stored block update it in place; blocks
+    without an id are matched to an identical stored block when one is left over,
+    so re-saving an unchanged timetable writes nothing. Returns
+    ``(operations, blocks, counts)`` where ``blocks`` is the resulting timetable in
+    submission order.
+    """
+    remaining = {str(doc["_id"]): doc for doc in stored}
+    by_content = {}
+    for doc in stored:
+        by_content.setdefault(tuple(doc.get(key) for key in BLOCK_FIELDS), []).append(str(doc["_id"]))
+    
+    inserts, updates, result = [], [], []
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    pending = []
+    # Explicit ids claim their stored blocks before any content matching happens
+    for block in submitted:
+        fields = {key: block[key] for key in BLOCK_FIELDS}
+        block_id = block.get("id")
+        if block_id and block_id in remaining:
+            current = remaining.pop(block_id)
+            changes = {key: value for key, value in fields.items() if current.get(key) != value}
+            if changes:
+                updates.append(UpdateOne({"_id": current["_id"], "user_id": user_id}, {"$set": changes}))
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+            result.append(dict(fields, _id=block_id))
+        else:
+            pending.append(len(result))
+            result.append(fields)
+    
+    for position in pending:
+        fields = result[position]
+        candidates = by_content.get(tuple(fields[key] for key in BLOCK_FIELDS), [])
+        while candidates and candidates[-1] not in remaining:
+            candidates.pop()
+        if candidates:
+            block_id = candidates.pop()
+            del remaining[block_id]
+            counts["unchanged"] += 1
+            result[position] = dict(fields, _id=block_id)
+        else:
+            fields["_id"] = ObjectId()
+            inserts.append(InsertOne(dict(fields, user_id=user_id)))
+            counts["inserted"] += 1
+    
+    # Inserts and updates go first so a failure part-way never leaves the timetable short
+    operations = inserts + updates
+    if remaining:
+        operations.append(DeleteMany({
+            "_id": {"$in": [doc["_id"] for doc in remaining.values()]},
+            "user_id": user_id
+        }))
+        counts["deleted"] = len(remaining)
+    
+    blocks = [dict(block, _id=str(block["_id"])) for block in result]
+    return operations, blocks, counts
+
+async def apply_block_writes(operations: list):
+    """Run the sync writes as one ordered bulk_write, transactionally when possible."""
+    if not operations:
+        return
+    
+    if SYNC_TRANSACTIONS:
+        try:
+            async with await async_client.start_session() as session:
+                async with session.start_transaction():
+                    await async_db.study_blocks.bulk_write(operations, ordered=True, session=session)
+            return
+        except OperationFailure as e:
+            # 20 = IllegalOperation: standalone servers do not support transactions
+            if e.code != 20:
+                raise
+    await async_db.study_blocks.bulk_write(operations, ordered=True)
+
+async def sync_blocks(user_id: str, blocks: list) -> dict:
+    stored = await async_db.study_blocks.find(
+        {"user_id": user_id}, projections.STUDY_BLOCK_LIST
+    ).to_list(length=None)
+    operations, result, counts = diff_blocks(user_id, blocks, stored)
+    await apply_block_writes(operations)
+    return {"blocks": result, **counts}
+
+@router.put("/blocks/sync", response_model=StudyBlockSyncResponse)
+async def sync_study_blocks(
+    blocks: List[StudyBlockSync],
+    reject_conflicts: bool = False,
+    user=Depends(get_current_user)
+):
+    """Make the user's timetable match ``blocks``, writing only what changed"""
+    submitted = [block.dict() for block in blocks]
+    if reject_conflicts:
+        # The submission replaces the timetable, so only check it against itself
+        raise_on_conflicts(await check_conflicts(str(user["_id"]), submitted, include_existing=False))
+    return await sync_blocks(str(user["_id"]), submitted)
+
 @router.put("/blocks/{block_id}", response_model=StudyBlockResponse)
-def update_study_block(
+async def update_study_block(
     block_id: str,
     block: StudyBlockCreate,
+    reject_conflicts: bool = False,
     user=Depends(get_current_user)
 ):
-    """Update a study block"""
-    # Check if block exists and belongs to user
-    existing_block = db.study_blocks.find_one({
-        "_id": ObjectId(block_id),
-        "user_id": str(user["_id"])
-    })
-    
-    if not existing_block:
-        raise HTTPException(status_code=404, detail="Study block not found")
-    
-    # Update the block
+    """Update a study block (with reject_conflicts=true, 409 if it would overlap another)"""
+    if reject_conflicts:
+        raise_on_conflicts(await check_conflicts(str(user["_id"]), [block.dict()], ignore_block_ids=[block_id]))
     block_doc = block.dict()
     block_doc["user_id"] = str(user["_id"])
     
-    result = db.study_blocks.update_one(
+    updated_block = await repository.update_and_fetch(
+        async_db.study_blocks,
         {"_id": ObjectId(block_id), "user_id": str(user["_id"])},
-        {"$set": block_doc}
+        {"$set": block_doc},
+        projection=projections.STUDY_BLOCK_LIST
     )
-    
-    if result.modified_count == 0:
+    if not updated_block:
         raise HTTPException(status_code=404, detail="Study block not found")
     
-    # Return the updated block
-    updated_block = db.study_blocks.find_one({"_id": ObjectId(block_id)})
     updated_block["_id"] = str(updated_block["_id"])
     return StudyBlockResponse(**updated_block)
 
 @router.delete("/blocks/{block_id}")
-def delete_study_block(
+async def delete_study_block(
     block_id: str,
     user=Depends(get_current_user)
 ):
     """Delete a study block"""
-    result = db.study_blocks.delete_one({
+    result = await async_db.study_blocks.delete_one({
         "_id": ObjectId(block_id),
         "user_id": str(user["_id"])
     })
@@ -83,40 +254,72 @@ def delete_study_block(
     return {"message": "Study block deleted successfully"}
 
 @router.delete("/blocks")
-def clear_all_blocks(
+async def clear_all_blocks(
     user=Depends(get_current_user)
 ):
     """Clear all study blocks for the current user"""
-    result = db.study_blocks.delete_many({"user_id": str(user["_id"])})
+    result = await async_db.study_blocks.delete_many({"user_id": str(user["_id"])})
     return {"message": f"Deleted {result.deleted_count} study blocks"}
 
 @router.post("/blocks/bulk", response_model=List[StudyBlockResponse])
-def create_multiple_blocks(
+async def create_multiple_blocks(
     blocks: List[StudyBlockCreate],
+    reject_conflicts: bool = False,
     user=Depends(get_current_user)
 ):
-    """Create multiple study blocks at once (for auto-allocation)"""
+    """Replace the timetable with ``blocks`` (for auto-allocation); unchanged blocks are kept"""
     if not blocks:
         raise HTTPException(status_code=400, detail="No blocks provided")
+    submitted = [block.dict() for block in blocks]
+    if reject_conflicts:
+        raise_on_conflicts(await check_conflicts(str(user["_id"]), submitted, include_existing=False))
     
-    # Clear existing blocks first
-    db.study_blocks.delete_many({"user_id": str(user["_id"])})
-    
-    # Create new blocks
-    block_docs = []
-    for block in blocks:
-        block_doc = block.dict()
-        block_doc["user_id"] = str(user["_id"])
-        block_doc["_id"] = ObjectId()
-        block_docs.append(block_doc)
+    result = await sync_blocks(str(user["_id"]), submitted)
+    return [StudyBlockResponse(**block) for block in result["blocks"]]
+
+@router.post("/allocate", response_model=AllocationResponse)
+async def allocate_study_blocks(
+    request: AllocationRequest,
+    save: bool = False,
+    user=Depends(get_current_user)
+):
+    """Plan study sessions for the user's courses in the free time around existing blocks.
+
+    Returns the proposed blocks; with ``save=true`` they are also added to the timetable.
+    """
+    try:
+        scheduling.parse_time(request.day_start)
+        scheduling.parse_time(request.day_end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="day_start and day_end must be HH:MM")
     
-    if block_docs:
-        db.study_blocks.insert_many(block_docs)
+    user_id = str(user["_id"])
+    course_query = {"user_id": user_id}
+    if request.course_ids is not None:
+        course_query["_id"] = {"$in": [ObjectId(cid) for cid in request.course_ids if ObjectId.is_valid(cid)]}
+    courses = await async_db.courses.find(
+        course_query, {"name": 1, "code": 1, "unit": 1, "difficulty": 1}
+    ).to_list(length=None)
+    existing = await async_db.study_blocks.find(
+        {"user_id": user_id}, {"day": 1, "startTime": 1, "endTime": 1, "type": 1}
+    ).to_list(length=None)
     
-    # Return the created blocks
-    created_blocks = []
-    for block_doc in block_docs:
-        block_doc["_id"] = str(block_doc["_id"])
-        created_blocks.append(StudyBlockResponse(**block_doc))
+    # CPU-bound; keep it off the event loop
+    result = await asyncio.to_thread(
+        scheduling.allocate,
+        courses,
+        existing,
+        days=sorted(set(request.days)),
+        day_start=request.day_start,
+        day_end=request.day_end,
+        session_minutes=request.session_minutes,
+        break_minutes=request.break_minutes,
+        minutes_per_unit=request.minutes_per_unit,
+        max_minutes_per_day=request.max_minutes_per_day,
+        time_budget_ms=ALLOCATION_TIME_BUDGET_MS,
+    )
     
-    return created_blocks 
\ No newline at end of file
+    if save and result["blocks"]:
+        block_docs = [dict(block, user_id=user_id) for block in result["blocks"]]
+        await async_db.study_blocks.insert_many(block_docs)
+    return result
@@ -0,0 +1,112 @@
+"""Incremental ``multipart/form-data`` parsing on top of ``request.stream()``.
+
+Starlette's ``request.form()`` spools the whole body before the handler
+runs. ``MultipartStream`` instead turns each received body chunk into
+events as it arrives, so file data can go straight to storage.
+"""
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Plain (non-file) form fields are small; cap them so they cannot be abused
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class MultipartError(ValueError):
+    pass
+
+
+class MultipartStream:
+    """Feed body chunks in, get parsing events out.
+
+    ``feed`` returns a list of events:
+
+    * ``("field", name, value)`` for a complete text field
+    * ``("file_start", name, filename, content_type)``
+    * ``("file_data", data)`` for each piece of the file as it is parsed
+    * ``("file_end",)``
+    """
+
+    def __init__(self, content_type_header: str):
+        content_type, params = parse_options_header(content_type_header or "")
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise MultipartError("Expected a multipart/form-data body")
+
+        self._events = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._field_name = None
+        self._field_value = bytearray()
+        self._in_file = False
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes) -> list:
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as error:
+            raise MultipartError("Malformed multipart body") from error
+        events, self._events = self._events, []
+        return events
+
+    def finish(self) -> list:
+        try:
+            self._parser.finalize()
+        except MultipartParseError as error:
+            raise MultipartError("Malformed multipart body") from error
+        events, self._events = self._events, []
+        return events
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._field_value = bytearray()
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        disposition, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if disposition != b"form-data" or b"name" not in options:
+            raise MultipartError("Invalid Content-Disposition in multipart body")
+        self._field_name = options[b"name"].decode("utf-8", "replace")
+        self._in_file = b"filename" in options
+        if self._in_file:
+            content_type = self._headers.get(b"content-type", b"application/octet-stream")
+            self._events.append((
+                "file_start",
+                self._field_name,
+                options[b"filename"].decode("utf-8", "replace"),
+                content_type.decode("latin-1"),
+            ))
+
+    def _on_part_data(self, data, start, end):
+        if self._in_file:
+            # Copy: the parser reuses its buffer for the next chunk
+            self._events.append(("file_data", bytes(data[start:end])))
+            return
+        if len(self._field_value) + (end - start) > MAX_FIELD_BYTES:
+            raise MultipartError(f"Form field '{self._field_name}' is too large")
+        self._field_value += data[start:end]
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._events.append(("file_end",))
+        else:
+            self._events.append(("field", self._field_name, self._field_value.decode("utf-8", "replace")))
+        self._in_file = False
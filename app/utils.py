@@ -1,9 +1,99 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
+from dotenv import load_dotenv
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# 0 workers hashes inline on the event loop (only useful for benchmarks)
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", 2))
+PASSWORD_QUEUE_DEPTH = int(os.getenv("PASSWORD_QUEUE_DEPTH", 32))
+# "queue": wait for a free slot; "reject": fail fast once the queue is full
+PASSWORD_ADMISSION_MODE = os.getenv("PASSWORD_ADMISSION_MODE", "queue")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=BCRYPT_ROUNDS)
 
 def hash_password(password: str):
     return pwd_context.hash(password)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordPoolBusy(Exception):
+    """Raised in "reject" mode when the hashing queue is already full."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated process pool so it never blocks the event loop.
+
+    At most ``workers`` hashes run at once and at most ``queue_depth`` more
+    wait for a worker. Beyond that, "reject" mode raises ``PasswordPoolBusy``
+    straight away and "queue" mode makes callers wait for a slot.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, admission_mode: str = "queue"):
+        if admission_mode not in ("queue", "reject"):
+            raise ValueError(f"Unknown admission mode: {admission_mode}")
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.admission_mode = admission_mode
+        self._executor = None
+        self._slots = None
+        self.in_flight = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.workers > 0 and self._executor is None:
+            # spawn, not fork: the parent already holds Mongo client threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_depth)
+        if self.admission_mode == "reject" and self._slots.locked():
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        self.start()
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, fn, *args)
+            finally:
+                self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "admission_mode": self.admission_mode,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_POOL_WORKERS,
+    queue_depth=PASSWORD_QUEUE_DEPTH,
+    admission_mode=PASSWORD_ADMISSION_MODE,
+)
@@ -0,0 +1,86 @@
+"""What-if CGPA projections: which grades reach a target CGPA?
+
+Every combination of grades for the hypothetical courses is evaluated at
+once with NumPy, as an n-dimensional array with one axis per course
+(``MAX_COURSES`` keeps it to a few million cells). The answer is the set of
+*minimal* combinations: those that reach the target but would miss it if
+any single course were one grade lower.
+"""
+import functools
+import time
+
+import numpy as np
+
+from .cgpa import GRADE_POINTS
+
+MAX_COURSES = 8
+
+
+def project(
+    current_points: float,
+    current_units: int,
+    units: list,
+    target: float,
+    max_results: int = 10,
+    grade_points: dict = GRADE_POINTS,
+) -> dict:
+    started = time.perf_counter()
+    # Grades from worst to best; equal-point letters collapse into one step
+    letters, values = [], []
+    for letter, points in sorted(grade_points.items(), key=lambda item: (item[1], item[0])):
+        if values and values[-1] == points:
+            continue
+        letters.append(letter)
+        values.append(points)
+    values = np.asarray(values, dtype=np.float64)
+    # Points lost by moving one step down from each grade (inf at the bottom)
+    step_down = np.concatenate(([np.inf], np.diff(values)))
+
+    unit_arr = np.asarray(units, dtype=np.float64)
+    n, g = len(units), len(values)
+    total_units = current_units + unit_arr.sum()
+    # Quality points the new courses must contribute, with a little float slack
+    needed = target * total_units - current_points - 1e-9
+
+    best_possible = current_points + values[-1] * unit_arr.sum()
+    combinations = g ** n
+
+    # One axis per course: points[i0, i1, ...] is the total for grades (i0, i1, ...).
+    # Built by broadcasting, so no per-combination Python work is done.
+    axes = [np.reshape(values * u, (1,) * j + (g,) + (1,) * (n - j - 1)) for j, u in enumerate(unit_arr)]
+    points = sum(axes, np.zeros((g,) * n))
+    slack = points - needed
+    # Minimal: every possible one-step downgrade drops below the target
+    drops = [np.reshape(step_down * u, (1,) * j + (g,) + (1,) * (n - j - 1)) for j, u in enumerate(unit_arr)]
+    smallest_drop = functools.reduce(np.minimum, drops, np.full((), np.inf))
+    minimal = (slack >= 0) & (smallest_drop > slack)
+
+    flat = np.flatnonzero(minimal)
+    minimal_count = len(flat)
+    flat_points = points.reshape(-1)[flat]
+    if minimal_count > max_results:
+        keep = np.argpartition(flat_points, max_results)[:max_results]
+        flat, flat_points = flat[keep], flat_points[keep]
+    grades = np.stack(np.unravel_index(flat, (g,) * n), axis=1) if n else np.zeros((len(flat), 0), dtype=np.int64)
+
+    solutions = []
+    # Least total effort first, ties broken by the grade pattern
+    order = np.lexsort(tuple(grades.T[::-1]) + (flat_points,))[:max_results]
+    for row in order:
+        new_points = float(flat_points[row])
+        solutions.append({
+            "grades": [letters[i] for i in grades[row]],
+            "semester_gpa": round(new_points / float(unit_arr.sum()), 2) if unit_arr.sum() else 0.0,
+            "projected_cgpa": round((current_points + new_points) / float(total_units), 2) if total_units else 0.0,
+        })
+
+    return {
+        "current_cgpa": round(current_points / current_units, 2) if current_units else 0.0,
+        "target_cgpa": target,
+        "reachable": minimal_count > 0,
+        "max_possible_cgpa": round(float(best_possible / total_units), 2) if total_units else 0.0,
+        "combinations_evaluated": combinations,
+        "minimal_combinations": minimal_count,
+        "solutions": solutions,
+        "compute_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
@@ -0,0 +1,111 @@
+"""Shared helpers for the benchmark scripts.
+
+The benchmarks talk to a real MongoDB (``MONGO_URI`` from ``.env``) and start
+their own uvicorn processes, so they never touch a deployed instance.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def start_server(app_path: str, port: int, env: dict = None) -> subprocess.Popen:
+    """Start ``uvicorn app_path`` on ``port`` and wait until it answers."""
+    proc_env = dict(os.environ)
+    proc_env.update(env or {})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"],
+        env=proc_env,
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(base_url + "/docs", timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"{app_path} did not start on port {port}")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def create_user(base_url: str, password: str = "bench-password") -> dict:
+    """Sign up a throwaway user and return ``{"email", "password", "token", "id"}``."""
+    suffix = uuid.uuid4().hex[:10]
+    email = f"bench-{suffix}@example.com"
+    requests.post(base_url + "/auth/signup", json={
+        "username": f"bench-{suffix}",
+        "full_name": f"Bench User {suffix}",
+        "email": email,
+        "password": password,
+    }).raise_for_status()
+    response = requests.post(base_url + "/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    body = response.json()
+    return {"email": email, "password": password, "token": body["access_token"], "id": body["user"]["id"]}
+
+
+def auth_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def run_load(method: str, url: str, total: int, concurrency: int, **kwargs) -> dict:
+    """Fire ``total`` requests with ``concurrency`` workers and summarise them."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def one(_):
+        start = time.perf_counter()
+        response = session.request(method, url, **kwargs)
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed)
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    latencies = sorted(s[0] for s in samples)
+    errors = sum(1 for s in samples if s[1] >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def print_table(title: str, rows: list):
+    """Print ``rows`` (a list of ``(label, summary)``) as a fixed-width table."""
+    print(f"\n{title}")
+    print(f"{'case':<32}{'req':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, s in rows:
+        print(f"{label:<32}{s['requests']:>8}{s['errors']:>6}{s['rps']:>10.1f}"
+              f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
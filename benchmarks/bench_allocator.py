@@ -0,0 +1,76 @@
+"""Timetable allocator speed on realistic course loads.
+
+Runs ``scheduling.allocate`` in-process (no database) over randomly
+generated students: 6-12 courses of 1-4 units with mixed difficulty, and
+up to 25 existing lecture blocks in a Monday-Friday 08:00-18:00 window.
+It reports latency percentiles, how much of the weekly demand was placed,
+and how often the per-request time budget cut an allocation short.
+
+    python -m benchmarks.bench_allocator --students 2000 --budget-ms 50
+"""
+import argparse
+import random
+import time
+
+from app.scheduling import allocate, format_time
+
+from ._common import percentile
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def random_student(rng: random.Random) -> tuple:
+    courses = [
+        {
+            "name": f"Course {i}",
+            "code": f"CRS{i:03d}",
+            "unit": rng.randint(1, 4),
+            "difficulty": rng.choice(DIFFICULTIES),
+        }
+        for i in range(rng.randint(6, 12))
+    ]
+    lectures = []
+    for _ in range(rng.randint(5, 25)):
+        start = rng.randrange(8 * 60, 17 * 60, 30)
+        length = rng.choice([60, 90, 120])
+        lectures.append({
+            "day": rng.randint(1, 5),
+            "startTime": format_time(start),
+            "endTime": format_time(min(start + length, 18 * 60)),
+            "type": "lecture",
+        })
+    return courses, lectures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    students = [random_student(rng) for _ in range(args.students)]
+
+    latencies = []
+    placed = requested = truncated = 0
+    started = time.perf_counter()
+    for courses, lectures in students:
+        result = allocate(courses, lectures, time_budget_ms=args.budget_ms)
+        latencies.append(result["elapsed_ms"])
+        placed += len(result["blocks"])
+        requested += len(result["blocks"]) + sum(u["sessions"] for u in result["unplaced"])
+        truncated += result["truncated"]
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{args.students} students, budget {args.budget_ms} ms")
+    print(f"latency ms: p50 {percentile(latencies, 50):.2f}, p95 {percentile(latencies, 95):.2f}, "
+          f"p99 {percentile(latencies, 99):.2f}, max {latencies[-1]:.2f}")
+    print(f"throughput: {args.students / wall:.0f} allocations/s")
+    print(f"sessions placed: {placed}/{requested} ({100 * placed / max(requested, 1):.1f}%), "
+          f"budget hit: {truncated}")
+
+
+if __name__ == "__main__":
+    main()
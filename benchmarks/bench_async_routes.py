@@ -0,0 +1,62 @@
+"""Requests per second for ``/courses/`` and ``/study-groups/``, sync vs async.
+
+Starts the async API (``app.main:app``) and the blocking reference app
+(``benchmarks.sync_app:app``) side by side against the same MongoDB, seeds a
+user with a handful of courses and groups, then drives both with the same
+concurrent load.
+
+    python -m benchmarks.bench_async_routes --requests 2000 --concurrency 64
+"""
+import argparse
+
+import requests
+
+from ._common import auth_headers, create_user, print_table, run_load, start_server, stop_server
+
+ASYNC_PORT = 8101
+SYNC_PORT = 8102
+
+
+def seed(base_url: str, token: str, courses: int, groups: int):
+    headers = auth_headers(token)
+    for i in range(courses):
+        requests.post(base_url + "/courses/", headers=headers, json={
+            "name": f"Course {i}", "code": f"BEN{i:03d}", "unit": 3,
+        }).raise_for_status()
+    for i in range(groups):
+        requests.post(base_url + "/study-groups/", headers=headers, json={
+            "name": f"Group {i}", "description": "benchmark", "course": f"BEN{i:03d}",
+        }).raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--groups", type=int, default=10)
+    args = parser.parse_args()
+
+    async_server = start_server("app.main:app", ASYNC_PORT)
+    sync_server = start_server("benchmarks.sync_app:app", SYNC_PORT)
+    try:
+        async_url = f"http://127.0.0.1:{ASYNC_PORT}"
+        user = create_user(async_url)
+        seed(async_url, user["token"], args.courses, args.groups)
+
+        rows = []
+        for path in ("/courses/", "/study-groups/"):
+            for mode, port in (("sync", SYNC_PORT), ("async", ASYNC_PORT)):
+                summary = run_load(
+                    "GET", f"http://127.0.0.1:{port}{path}", args.requests, args.concurrency,
+                    headers=auth_headers(user["token"]),
+                )
+                rows.append((f"{mode:<6} {path}", summary))
+        print_table(f"{args.requests} requests, concurrency {args.concurrency}", rows)
+    finally:
+        stop_server(async_server)
+        stop_server(sync_server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Fan-out load test for the discussion broker.
+
+``inprocess`` mode drives ``InProcessBroker`` directly. It holds thousands
+of idle subscribers spread over many groups, a few active listeners and a
+few deliberately slow ones on one hot group. It reports publish cost,
+delivery latency, memory, and what happened to the slow consumers:
+
+    python -m benchmarks.bench_broker_fanout --subscribers 5000 --messages 2000
+
+``websocket`` mode starts the API, opens the same number of idle WebSockets
+on one group and measures REST-post to WebSocket-delivery latency:
+
+    python -m benchmarks.bench_broker_fanout --mode websocket --subscribers 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from app.broker import InProcessBroker, SubscriptionClosed
+
+from ._common import percentile
+
+
+async def run_inprocess(args):
+    tracemalloc.start()
+    broker = InProcessBroker(queue_size=args.queue_size, policy=args.policy)
+    hot = "hot-group"
+
+    # Idle subscribers: they never read, spread across groups
+    idle = [broker.subscribe(f"group-{i % args.groups}") for i in range(args.subscribers)]
+    memory_idle = tracemalloc.get_traced_memory()[0]
+
+    latencies = []
+
+    async def active_listener(subscription):
+        try:
+            while True:
+                sent_at = await subscription.get()
+                latencies.append(time.perf_counter() - sent_at)
+        except SubscriptionClosed:
+            pass
+
+    async def slow_listener(subscription):
+        try:
+            while True:
+                await subscription.get()
+                await asyncio.sleep(args.slow_delay)
+        except SubscriptionClosed:
+            pass
+
+    active = [broker.subscribe(hot) for _ in range(args.active)]
+    slow = [broker.subscribe(hot) for _ in range(args.slow)]
+    # Idle subscribers on the hot group fill their queues and exercise the policy
+    hot_idle = [broker.subscribe(hot) for _ in range(args.subscribers // 10)]
+    tasks = [asyncio.create_task(active_listener(s)) for s in active]
+    tasks += [asyncio.create_task(slow_listener(s)) for s in slow]
+
+    publish_times = []
+    for _ in range(args.messages):
+        start = time.perf_counter()
+        await broker.publish(hot, time.perf_counter())
+        publish_times.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.5)
+    await broker.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    memory_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    publish_times.sort()
+    latencies.sort()
+    print(f"Subscribers: {args.subscribers} idle over {args.groups} groups, "
+          f"{len(hot_idle)} idle + {args.active} active + {args.slow} slow on the hot group")
+    print(f"Memory with idle subscribers: {memory_idle / 1024 / 1024:.1f} MiB, peak {memory_peak / 1024 / 1024:.1f} MiB")
+    print(f"Publish (fan-out) per message: mean {statistics.fmean(publish_times) * 1e6:.0f} us, "
+          f"p99 {percentile(publish_times, 99) * 1e6:.0f} us")
+    if latencies:
+        print(f"Delivery to active listeners: {len(latencies)} messages, p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+    disconnected = sum(1 for s in slow + hot_idle if s.close_reason == "slow consumer")
+    dropped = sum(s.dropped for s in slow + hot_idle)
+    print(f"Slow/idle hot-group consumers disconnected: {disconnected}, messages dropped: {dropped}")
+    print(f"Untouched idle subscribers still open: {sum(1 for s in idle if s.close_reason == 'server shutting down')}")
+
+
+async def run_websocket(args):
+    import requests
+    import websockets
+
+    from ._common import auth_headers, create_user, start_server, stop_server
+
+    port = 8104
+    server = start_server("app.main:app", port)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        user = create_user(base_url)
+        headers = auth_headers(user["token"])
+        group = requests.post(base_url + "/study-groups/", headers=headers, json={
+            "name": "Fan-out", "description": "benchmark", "course": "BEN000", "max_members": 5,
+        }).json()
+        ws_url = f"ws://127.0.0.1:{port}/study-groups/{group['_id']}/discussions/ws?token={user['token']}"
+
+        sockets = []
+        for _ in range(args.subscribers):
+            sockets.append(await websockets.connect(ws_url, max_queue=None))
+        print(f"Opened {len(sockets)} idle WebSockets")
+
+        listener = await websockets.connect(ws_url)
+        latencies = []
+        loop = asyncio.get_running_loop()
+        for i in range(args.messages):
+            start = time.perf_counter()
+            await loop.run_in_executor(None, lambda: requests.post(
+                base_url + f"/study-groups/{group['_id']}/discussions",
+                headers=headers, json={"content": f"message {i}", "group_id": group["_id"]},
+            ))
+            await listener.recv()
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"Post-to-delivery over {len(latencies)} messages: p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+        for socket in sockets + [listener]:
+            await socket.close()
+    finally:
+        stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "websocket"], default="inprocess")
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--groups", type=int, default=500)
+    parser.add_argument("--active", type=int, default=20)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--policy", choices=["disconnect", "drop_oldest"], default="disconnect")
+    args = parser.parse_args()
+    if args.mode == "websocket":
+        args.messages = min(args.messages, 200)
+        asyncio.run(run_websocket(args))
+    else:
+        asyncio.run(run_inprocess(args))
+
+
+if __name__ == "__main__":
+    main()
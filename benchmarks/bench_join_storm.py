@@ -0,0 +1,103 @@
+"""Hundreds of parallel joins against one study group, then an invariant check.
+
+Signs up ``--users`` throwaway users, creates a group with ``--capacity`` seats and
+has every user join at once (each sends ``--repeat`` joins, so duplicates race
+too). Afterwards the group document and ``group_members`` are read straight from
+MongoDB and checked:
+
+* no more members than ``max_members``
+* no user with two ``group_members`` records
+* ``member_count`` equals the number of records
+* exactly ``min(users, capacity - 1)`` joins answered 200
+
+    python -m benchmarks.bench_join_storm --users 300 --capacity 50 --repeat 2
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bson import ObjectId
+
+from app.database import db
+from ._common import auth_headers, create_user, start_server, stop_server, summarize
+
+PORT = 8108
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--capacity", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=2, help="joins sent per user")
+    parser.add_argument("--concurrency", type=int, default=128)
+    args = parser.parse_args()
+
+    # Cheap hashing so signing up hundreds of users does not dominate the run
+    server = start_server("app.main:app", PORT, env={"BCRYPT_ROUNDS": "4", "PASSWORD_POOL_WORKERS": "0"})
+    base_url = f"http://127.0.0.1:{PORT}"
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            users = list(pool.map(lambda _: create_user(base_url), range(args.users + 1)))
+        creator, joiners = users[0], users[1:]
+        response = requests.post(base_url + "/study-groups/", headers=auth_headers(creator["token"]), json={
+            "name": "join storm",
+            "description": "benchmark group",
+            "course": "BENCH",
+            "max_members": args.capacity,
+            "is_private": False,
+        })
+        response.raise_for_status()
+        group_id = response.json()["_id"]
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+        session.mount("http://", adapter)
+        url = f"{base_url}/study-groups/{group_id}/join"
+
+        def join(user):
+            start = time.perf_counter()
+            response = session.post(url, headers=auth_headers(user["token"]), json={})
+            return time.perf_counter() - start, response.status_code
+
+        attempts = [user for user in joiners for _ in range(args.repeat)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            samples = list(pool.map(join, attempts))
+        elapsed = time.perf_counter() - started
+
+        group = db.study_groups.find_one({"_id": ObjectId(group_id)}, {"member_count": 1, "max_members": 1})
+        members = [r["user_id"] for r in db.group_members.find({"group_id": group_id}, {"user_id": 1})]
+        accepted = sum(1 for _, status in samples if status == 200)
+        expected = min(len(joiners), args.capacity - 1)
+
+        summary = summarize(samples, elapsed)
+        print(f"{len(attempts)} joins in {elapsed:.2f}s ({summary['rps']:.0f}/s, "
+              f"p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms)")
+        print(f"accepted={accepted} records={len(members)} member_count={group['member_count']} "
+              f"max_members={group['max_members']}")
+
+        problems = []
+        if len(members) > group["max_members"]:
+            problems.append("group overfilled")
+        if len(set(members)) != len(members):
+            problems.append("duplicate members")
+        if group["member_count"] != len(members):
+            problems.append("member_count out of sync")
+        if accepted != expected:
+            problems.append(f"expected {expected} successful joins")
+
+        db.study_groups.delete_one({"_id": ObjectId(group_id)})
+        db.group_members.delete_many({"group_id": group_id})
+    finally:
+        stop_server(server)
+
+    if problems:
+        print("FAILED: " + ", ".join(problems))
+        sys.exit(1)
+    print("OK: membership invariants held")
+
+
+if __name__ == "__main__":
+    main()
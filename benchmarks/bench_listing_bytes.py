@@ -0,0 +1,80 @@
+"""Bytes read from MongoDB per resource-listing call, with and without projection.
+
+Seeds a throwaway group with legacy resources that still carry an inline
+``file_base64`` payload, then reads the listing the way
+``get_group_resources`` does: once unprojected (the old behaviour) and once
+with ``projections.GROUP_RESOURCE_LIST``. Documents are read as raw BSON,
+so the byte counts are exactly what the server sent.
+
+Exits non-zero if a projected listing reads more than ``--max-bytes-per-doc``
+per resource, so it can be used as a regression check.
+
+    python -m benchmarks.bench_listing_bytes --resources 50 --payload-kb 2048
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from app import projections
+from app.database import db
+
+
+def read_listing(collection, group_id: str, projection=None):
+    started = time.perf_counter()
+    docs = list(collection.find({"group_id": group_id}, projection).sort("uploaded_at", -1))
+    elapsed = time.perf_counter() - started
+    return sum(len(doc.raw) for doc in docs), len(docs), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--payload-kb", type=int, default=2048)
+    parser.add_argument("--max-bytes-per-doc", type=int, default=4096)
+    args = parser.parse_args()
+
+    group_id = str(ObjectId())
+    payload = base64.b64encode(os.urandom(args.payload_kb * 1024)).decode()
+    now = datetime.now(timezone.utc)
+    db.group_resources.insert_many([
+        {
+            "name": f"notes-{i}.pdf",
+            "description": "benchmark",
+            "file_type": "application/pdf",
+            "file_size": args.payload_kb * 1024,
+            "group_id": group_id,
+            "file_base64": payload,
+            "uploaded_by": "bench",
+            "uploader_name": "Bench",
+            "uploaded_at": now,
+            "download_url": "/bench",
+        }
+        for i in range(args.resources)
+    ])
+    raw = db.get_collection("group_resources", codec_options=CodecOptions(document_class=RawBSONDocument))
+    try:
+        full_bytes, count, full_time = read_listing(raw, group_id)
+        projected_bytes, _, projected_time = read_listing(raw, group_id, projections.GROUP_RESOURCE_LIST)
+    finally:
+        db.group_resources.delete_many({"group_id": group_id})
+
+    print(f"{count} resources with {args.payload_kb} KiB inline payloads")
+    print(f"{'':<12}{'bytes/call':>16}{'bytes/doc':>14}{'ms/call':>10}")
+    print(f"{'full':<12}{full_bytes:>16,}{full_bytes // count:>14,}{full_time * 1000:>10.1f}")
+    print(f"{'projected':<12}{projected_bytes:>16,}{projected_bytes // count:>14,}{projected_time * 1000:>10.1f}")
+
+    if projected_bytes // count > args.max_bytes_per_doc:
+        print(f"FAIL: projected listing reads more than {args.max_bytes_per_doc} bytes per resource")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Latency of ``/courses/`` while a burst of logins hits the same server.
+
+Each scenario starts a fresh API process with different password-hashing
+settings, runs a login storm in the background and samples ``GET /courses/``
+at the same time:
+
+* ``inline``  - bcrypt on the event loop (PASSWORD_POOL_WORKERS=0)
+* ``queue``   - process pool, excess logins wait for a slot
+* ``reject``  - process pool, excess logins get an immediate 503
+
+    python -m benchmarks.bench_login_storm --duration 20 --storm-concurrency 64
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+from ._common import auth_headers, create_user, print_table, start_server, stop_server, summarize
+
+PORT = 8103
+
+SCENARIOS = {
+    "inline": {"PASSWORD_POOL_WORKERS": "0"},
+    "queue": {"PASSWORD_POOL_WORKERS": "2", "PASSWORD_ADMISSION_MODE": "queue"},
+    "reject": {"PASSWORD_POOL_WORKERS": "2", "PASSWORD_ADMISSION_MODE": "reject", "PASSWORD_QUEUE_DEPTH": "8"},
+}
+
+
+def storm(base_url: str, user: dict, stop: threading.Event, results: list):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = session.post(base_url + "/auth/login", json={"email": user["email"], "password": user["password"]})
+        results.append((time.perf_counter() - start, response.status_code))
+
+
+def run_scenario(name: str, env: dict, args) -> list:
+    server = start_server("app.main:app", PORT, env=env)
+    base_url = f"http://127.0.0.1:{PORT}"
+    try:
+        user = create_user(base_url)
+        headers = auth_headers(user["token"])
+
+        stop = threading.Event()
+        logins = []
+        threads = [
+            threading.Thread(target=storm, args=(base_url, user, stop, logins), daemon=True)
+            for _ in range(args.storm_concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        samples = []
+        session = requests.Session()
+        started = time.perf_counter()
+        while time.perf_counter() - started < args.duration:
+            start = time.perf_counter()
+            response = session.get(base_url + "/courses/", headers=headers)
+            samples.append((time.perf_counter() - start, response.status_code))
+            time.sleep(args.interval)
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        login_summary = summarize(logins, elapsed)
+        rejected = sum(1 for _, status in logins if status == 503)
+        print(f"{name}: {len(logins)} logins, {rejected} rejected with 503")
+        return [
+            (f"{name} GET /courses/", summarize(samples, elapsed)),
+            (f"{name} POST /auth/login", login_summary),
+        ]
+    finally:
+        stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--interval", type=float, default=0.05, help="pause between /courses/ samples")
+    parser.add_argument("--storm-concurrency", type=int, default=64)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    args = parser.parse_args()
+
+    rows = []
+    for name in args.scenario or list(SCENARIOS):
+        rows.extend(run_scenario(name, SCENARIOS[name], args))
+    print_table(f"Login storm ({args.storm_concurrency} concurrent logins, {args.duration:.0f}s)", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Access-check latency for a large group: members array vs group_members lookup.
+
+Seeds scratch collections (``bench_groups`` and ``bench_group_members``) with one
+group of ``--members`` members in both shapes, then times ``--checks`` access
+checks for random members and non-members:
+
+* ``array``      - load the group document and test ``user_id in group["members"]``
+  (what every endpoint did before membership moved out of the group document)
+* ``collection`` - point lookup on the unique ``(group_id, user_id)`` index
+
+Talks to MongoDB directly (``MONGO_URI``); the scratch collections are dropped
+afterwards.
+
+    python -m benchmarks.bench_membership_check --members 10000 --checks 2000
+"""
+import argparse
+import random
+import time
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from app.database import db
+from ._common import print_table, summarize
+
+GROUPS = "bench_groups"
+MEMBERS = "bench_group_members"
+
+
+def seed(member_count: int) -> tuple:
+    groups, members = db[GROUPS], db[MEMBERS]
+    groups.drop()
+    members.drop()
+    members.create_index([("group_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+
+    group_id = ObjectId()
+    user_ids = [str(ObjectId()) for _ in range(member_count)]
+    groups.insert_one({
+        "_id": group_id,
+        "name": "bench",
+        "is_private": True,
+        "members": user_ids,
+        "member_count": member_count,
+    })
+    members.insert_many(
+        [{"group_id": str(group_id), "user_id": user_id, "role": "member"} for user_id in user_ids],
+        ordered=False,
+    )
+    return group_id, user_ids
+
+
+def check_array(group_id: ObjectId, user_id: str) -> bool:
+    group = db[GROUPS].find_one({"_id": group_id})
+    return user_id in group["members"]
+
+
+def check_collection(group_id: ObjectId, user_id: str) -> bool:
+    return db[MEMBERS].find_one({"group_id": str(group_id), "user_id": user_id}, {"_id": 1}) is not None
+
+
+def run(check, group_id: ObjectId, candidates: list) -> dict:
+    samples = []
+    started = time.perf_counter()
+    for user_id in candidates:
+        start = time.perf_counter()
+        check(group_id, user_id)
+        samples.append((time.perf_counter() - start, 200))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--checks", type=int, default=2_000)
+    args = parser.parse_args()
+
+    group_id, user_ids = seed(args.members)
+    try:
+        # Half members, half strangers, in a fixed order shared by both cases
+        rng = random.Random(42)
+        candidates = [
+            rng.choice(user_ids) if rng.random() < 0.5 else str(ObjectId())
+            for _ in range(args.checks)
+        ]
+        for check in (check_array, check_collection):
+            check(group_id, candidates[0])  # warm the cache and connection
+
+        rows = [
+            ("array (find_one + in)", run(check_array, group_id, candidates)),
+            ("collection (point lookup)", run(check_collection, group_id, candidates)),
+        ]
+        document_size = len(db[GROUPS].find_raw_batches({"_id": group_id}).next())
+        print(f"group document with {args.members} members: {document_size / 1024:.0f} KiB on the wire")
+        print_table(f"Membership check, {args.members} members, {args.checks} checks", rows)
+    finally:
+        db[GROUPS].drop()
+        db[MEMBERS].drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Discussion message throughput: direct inserts vs batched ingest.
+
+Each scenario starts a fresh API process, signs up a user, creates a group and
+posts ``--messages`` messages to it with ``--concurrency`` parallel clients:
+
+* ``direct``    - one ``insert_one`` per request (DISCUSSION_INGEST=direct)
+* ``persisted`` - batched ingest, each request waits until its batch is stored
+* ``accepted``  - batched ingest, requests return 202 once the message is queued
+
+    python -m benchmarks.bench_message_ingest --messages 5000 --concurrency 64
+"""
+import argparse
+
+import requests
+from bson import ObjectId
+
+from app.database import db
+from ._common import auth_headers, create_user, print_table, run_load, start_server, stop_server
+
+PORT = 8109
+
+SCENARIOS = {
+    "direct": ({"DISCUSSION_INGEST": "direct"}, "persisted"),
+    "persisted": ({"DISCUSSION_INGEST": "batched"}, "persisted"),
+    "accepted": ({"DISCUSSION_INGEST": "batched"}, "accepted"),
+}
+
+
+def run_scenario(name: str, args) -> tuple:
+    env, ack = SCENARIOS[name]
+    env = dict(env, INGEST_BATCH_SIZE=str(args.batch_size), INGEST_MAX_DELAY_MS=str(args.max_delay_ms))
+    server = start_server("app.main:app", PORT, env=env)
+    base_url = f"http://127.0.0.1:{PORT}"
+    try:
+        user = create_user(base_url)
+        headers = auth_headers(user["token"])
+        response = requests.post(base_url + "/study-groups/", headers=headers, json={
+            "name": f"ingest {name}",
+            "description": "benchmark group",
+            "course": "BENCH",
+            "is_private": False,
+        })
+        response.raise_for_status()
+        group_id = response.json()["_id"]
+
+        summary = run_load(
+            "POST",
+            f"{base_url}/study-groups/{group_id}/discussions?ack={ack}",
+            args.messages,
+            args.concurrency,
+            headers=headers,
+            json={"content": "benchmark message", "group_id": group_id},
+        )
+    finally:
+        # Stopping drains the ingest queue, so every accepted message is written by now
+        stop_server(server)
+
+    stored = db.discussion_messages.count_documents({"group_id": group_id})
+    print(f"{name}: {stored}/{args.messages} messages stored")
+    db.discussion_messages.delete_many({"group_id": group_id})
+    db.group_members.delete_many({"group_id": group_id})
+    db.study_groups.delete_one({"_id": ObjectId(group_id)})
+    return f"{name} ({ack})", summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-delay-ms", type=float, default=20)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    args = parser.parse_args()
+
+    rows = [run_scenario(name, args) for name in args.scenario or list(SCENARIOS)]
+    print_table(f"Message ingest ({args.messages} messages, {args.concurrency} clients)", rows)
+
+
+if __name__ == "__main__":
+    main()
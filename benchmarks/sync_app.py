@@ -0,0 +1,56 @@
+"""Blocking reference implementation of ``/courses/`` and ``/study-groups/``.
+
+Mirrors the async handlers in ``app`` with sync ``def`` + ``pymongo``: the
+same queries (membership from ``group_members``, the same projections, sort
+and page size) and the same response models, so that ``bench_async_routes``
+compares only the I/O model. The token lookup is not cached here, unlike
+``app.dependencies.get_current_user``.
+Run it with ``uvicorn benchmarks.sync_app:app``.
+"""
+from typing import List
+
+from bson import ObjectId
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+
+from app import projections
+from app.database import db
+from app.schemas import CourseResponse, StudyGroupResponse
+from app.study_groups import ACTIVE_GROUP, GROUPS_SORT, sanitize_group_for_user
+from app.token import verify_access_token
+
+app = FastAPI()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+
+# Page size of the async listing when no ``limit`` is passed
+PAGE_SIZE = 50
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    payload = verify_access_token(token)
+    user = db.users.find_one({"email": payload["sub"]})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    user["_id"] = str(user["_id"])
+    return user
+
+
+@app.get("/courses/", response_model=List[CourseResponse])
+def get_courses(user=Depends(get_current_user)):
+    courses = list(db.courses.find({"user_id": user["_id"]}, projections.COURSE_LIST))
+    for course in courses:
+        course["_id"] = str(course["_id"])
+    return [CourseResponse(**course) for course in courses]
+
+
+@app.get("/study-groups/", response_model=List[StudyGroupResponse])
+def get_study_groups(user=Depends(get_current_user)):
+    user_id = user["_id"]
+    member_of = {m["group_id"] for m in db.group_members.find({"user_id": user_id}, {"group_id": 1})}
+    my_groups_query = {"_id": {"$in": [ObjectId(gid) for gid in member_of if ObjectId.is_valid(gid)]}}
+    query = {"$or": [my_groups_query, {"is_private": False}], **ACTIVE_GROUP}
+    groups = db.study_groups.find(query, projections.STUDY_GROUP_LIST).sort(GROUPS_SORT).limit(PAGE_SIZE)
+    return [
+        StudyGroupResponse(**sanitize_group_for_user(group, user_id, is_member=str(group["_id"]) in member_of))
+        for group in groups
+    ]
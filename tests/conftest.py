@@ -0,0 +1,31 @@
+"""Shared fixtures: every test runs against an in-memory MongoDB (mongomock-motor).
+
+The fake database is installed before any router module imports
+``async_db``, so the app code under test talks to it unchanged.
+"""
+import os
+
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ENSURE_INDEXES_ON_STARTUP", "false")
+os.environ.setdefault("PASSWORD_POOL_WORKERS", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import mongomock_motor
+import pytest
+
+import app.database as database
+
+database.async_db = mongomock_motor.AsyncMongoMockClient()[database.DB_NAME]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def async_db():
+    """The fake database, emptied after each test."""
+    yield database.async_db
+    for name in await database.async_db.list_collection_names():
+        await database.async_db.drop_collection(name)
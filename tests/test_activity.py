@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.activity import ActivityBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def buffer(async_db):
+    return ActivityBuffer(collection=async_db.study_groups, interval=60)
+
+
+async def test_invalid_group_id_does_not_drop_other_bumps(buffer, async_db):
+    group_id = (await async_db.study_groups.insert_one({"last_activity": datetime(2024, 1, 1)})).inserted_id
+    when = datetime(2024, 6, 1)
+    await buffer.record(str(group_id), when)
+    await buffer.record("not-an-id", when)
+
+    assert await buffer.flush() == 1
+
+    group = await async_db.study_groups.find_one({"_id": group_id})
+    assert group["last_activity"] == when
+    assert buffer.stats()["dropped"] == 1
+    assert buffer.stats()["pending"] == 0
+
+
+async def test_failed_flush_keeps_the_newest_timestamps(buffer, async_db, monkeypatch):
+    group_id = str(ObjectId())
+    first = datetime.now(timezone.utc)
+    await buffer.record(group_id, first)
+
+    async def unavailable(*args, **kwargs):
+        raise ConnectionError("no primary")
+
+    monkeypatch.setattr(buffer, "collection", type("Collection", (), {"bulk_write": staticmethod(unavailable)})())
+    assert await buffer.flush() == 0
+    await buffer.record(group_id, first - timedelta(seconds=5))
+
+    assert buffer._pending == {group_id: first}
+    assert buffer.failures == 1
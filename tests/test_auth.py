@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app import auth, utils
+from app.schemas import UserCreate
+
+pytestmark = pytest.mark.anyio
+
+
+def new_user(email="a@x.com", username="alice"):
+    return UserCreate(username=username, full_name="Alice Smith", email=email, password="pw")
+
+
+async def test_concurrent_signup_with_the_same_email_is_a_400(async_db, monkeypatch):
+    await async_db.users.create_index([("email", ASCENDING)], unique=True)
+    real_hash = utils.password_hasher.hash
+
+    async def racing_hash(password):
+        # Another signup for the same email lands while this one is hashing
+        await async_db.users.insert_one({"email": "a@x.com", "username": "someone-else"})
+        return await real_hash(password)
+
+    monkeypatch.setattr(utils.password_hasher, "hash", racing_hash)
+
+    with pytest.raises(HTTPException) as error:
+        await auth.signup(new_user())
+
+    assert error.value.status_code == 400
+    assert error.value.detail == "Email already registered."
+
+
+class UsernameTakenOnInsert:
+    """``users`` collection whose insert loses a race on the username index.
+
+    mongomock leaves ``DuplicateKeyError.details`` empty, so this raises the
+    error the way MongoDB reports it.
+    """
+
+    async def find_one(self, query, *args, **kwargs):
+        return None
+
+    async def insert_one(self, doc):
+        raise DuplicateKeyError("E11000", 11000, {"keyPattern": {"username": 1}, "keyValue": {"username": "alice"}})
+
+
+async def test_duplicate_username_from_the_index_is_a_400(monkeypatch):
+    monkeypatch.setattr(auth, "async_db", type("Database", (), {"users": UsernameTakenOnInsert()})())
+
+    with pytest.raises(HTTPException) as error:
+        await auth.signup(new_user())
+
+    assert error.value.status_code == 400
+    assert error.value.detail == "Username already taken."
@@ -0,0 +1,38 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import dbstats
+from app.main import count_db_calls
+
+
+def simulate_command():
+    dbstats.command_counter.started(None)
+
+
+app = FastAPI()
+app.middleware("http")(count_db_calls)
+
+
+@app.get("/download")
+async def download():
+    simulate_command()
+
+    async def chunks():
+        for _ in range(3):
+            simulate_command()
+            yield b"chunk"
+    return StreamingResponse(chunks())
+
+
+def test_streamed_commands_are_logged_after_the_body(caplog):
+    with caplog.at_level(logging.INFO, logger="app.dbstats"):
+        response = TestClient(app).get("/download")
+
+    assert response.content == b"chunk" * 3
+    # The header is sent before (most of) the body is produced
+    header_calls = int(response.headers[dbstats.DB_CALLS_HEADER])
+    assert 1 <= header_calls < 4
+    assert f"GET /download: 4 DB calls ({4 - header_calls} after the headers were sent)" in caplog.text
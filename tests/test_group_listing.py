@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import Response
+
+from app import study_groups
+from app.pagination import NEXT_CURSOR_HEADER
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_paging_is_stable_while_groups_get_activity(async_db):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    ids = []
+    for i in range(5):
+        result = await async_db.study_groups.insert_one({
+            "name": f"g{i}", "description": "d", "course": "c", "creator_id": "someone",
+            "is_private": False, "max_members": 20, "member_count": 1, "is_active": True,
+            "created_at": start + timedelta(hours=i), "last_activity": start + timedelta(hours=i),
+        })
+        ids.append(str(result.inserted_id))
+
+    seen = []
+    cursor = None
+    while True:
+        response = Response()
+        page = await study_groups.get_study_groups(response, course=None, limit=2, cursor=cursor, user={"_id": "u1"})
+        seen.extend(group.id for group in page)
+        # A message in the oldest group lands between page requests
+        await async_db.study_groups.update_one(
+            {"name": "g0"}, {"$set": {"last_activity": datetime.now(timezone.utc)}}
+        )
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+
+    assert seen == list(reversed(ids))
+
+
+async def test_group_detail_lists_every_member(async_db):
+    group_id = (await async_db.study_groups.insert_one({
+        "name": "g", "description": "d", "course": "c", "creator_id": "u1", "is_private": False,
+        "max_members": 5, "member_count": 3, "is_active": True, "created_at": datetime.now(timezone.utc),
+    })).inserted_id
+    for user_id in ("u1", "u2", "u3"):
+        await async_db.group_members.insert_one({"group_id": str(group_id), "user_id": user_id})
+
+    group = await study_groups.get_study_group(str(group_id), access={"user_id": "u2", "is_member": True})
+
+    assert sorted(group.members) == ["u1", "u2", "u3"]
+    assert group.is_member
+
+
+async def test_timestamp_bounds_exclude_messages_at_that_instant(async_db):
+    group_id = str(ObjectId())
+    start = datetime(2024, 1, 1, 12, 0)
+    for minute in range(3):
+        await async_db.discussion_messages.insert_one({
+            "group_id": group_id, "content": f"m{minute}", "user_id": "u1", "user_name": "U",
+            "user_initials": "U", "created_at": start + timedelta(minutes=minute),
+        })
+    middle = (start + timedelta(minutes=1)).isoformat()
+
+    before = await study_groups.get_discussion_messages(group_id, Response(), limit=10, before=middle, after=None)
+    after = await study_groups.get_discussion_messages(group_id, Response(), limit=10, before=None, after=middle)
+
+    assert [message.content for message in before] == ["m0"]
+    assert [message.content for message in after] == ["m2"]
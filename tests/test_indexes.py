@@ -0,0 +1,25 @@
+import pytest
+
+from app.indexes import RequiredIndexesMissing, ensure_indexes, required_drift
+
+pytestmark = pytest.mark.anyio
+
+
+def test_only_unique_indexes_are_required():
+    drift = {
+        "users": {"missing": ["email_unique"], "changed": [], "extra": []},
+        "courses": {"missing": ["user_id"], "changed": [], "extra": []},
+        "study_groups": {"missing": [], "changed": ["access_code_unique"], "extra": ["old"]},
+    }
+
+    assert required_drift(drift) == ["users.email_unique", "study_groups.access_code_unique"]
+
+
+async def test_startup_refuses_to_run_without_a_unique_index(async_db):
+    # Duplicate data keeps the unique email index from being built
+    await async_db.users.insert_many([{"email": "a@x.com", "username": "a"}, {"email": "a@x.com", "username": "b"}])
+
+    with pytest.raises(RequiredIndexesMissing) as error:
+        await ensure_indexes(async_db)
+
+    assert "users.email_unique" in str(error.value)
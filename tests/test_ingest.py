@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from fastapi import Response
+from pymongo.errors import BulkWriteError
+
+from app import study_groups
+from app.ingest import ACK_ACCEPTED, ACK_HEADER, ACK_PERSISTED, IngestBusy, IngestFailed, MessageIngest
+from app.schemas import DiscussionMessageCreate
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def ingest(async_db):
+    return MessageIngest(collection=async_db.discussion_messages, enabled=True, max_delay_ms=1)
+
+
+async def test_submit_is_refused_before_start_and_after_stop(ingest, async_db):
+    with pytest.raises(IngestBusy):
+        await ingest.submit({"_id": ObjectId()})
+
+    await ingest.start()
+    await ingest.submit({"_id": ObjectId()}, ACK_PERSISTED)
+    await ingest.submit({"_id": ObjectId()}, ACK_ACCEPTED)
+    await ingest.stop()
+
+    with pytest.raises(IngestBusy):
+        await ingest.submit({"_id": ObjectId()})
+    assert await async_db.discussion_messages.count_documents({}) == 2
+    assert ingest.rejected == 2
+
+
+async def test_direct_mode_reports_the_ack_it_gave(async_db, monkeypatch):
+    monkeypatch.setattr(study_groups.message_ingest, "enabled", False)
+    response = Response()
+    group_id = str(ObjectId())
+
+    message = await study_groups.create_discussion_message(
+        group_id,
+        DiscussionMessageCreate(content="hi", group_id=group_id),
+        response,
+        ack=ACK_ACCEPTED,
+        access={"is_member": True},
+        user={"_id": "u1", "full_name": "U One"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers[ACK_HEADER] == ACK_PERSISTED
+    assert await async_db.discussion_messages.find_one({"_id": ObjectId(message.id)})
+
+
+class UnexpectedBulkWriteError:
+    """``discussion_messages`` whose insert fails with a malformed error."""
+
+    async def insert_many(self, docs, ordered=True):
+        raise BulkWriteError({"writeErrors": [{"code": 121}]})  # no "index"
+
+
+async def test_unexpected_write_failure_settles_every_submitter():
+    ingest = MessageIngest(collection=UnexpectedBulkWriteError(), enabled=True, max_delay_ms=5)
+    await ingest.start()
+    try:
+        results = await asyncio.wait_for(asyncio.gather(
+            ingest.submit({"_id": ObjectId()}, ACK_PERSISTED),
+            ingest.submit({"_id": ObjectId()}, ACK_PERSISTED),
+            ingest.submit({"_id": ObjectId()}, ACK_ACCEPTED),
+            return_exceptions=True,
+        ), timeout=2)
+        await asyncio.wait_for(ingest._queue.join(), timeout=2)
+    finally:
+        await ingest.stop()
+
+    assert [type(result) for result in results] == [IngestFailed, IngestFailed, type(None)]
+    assert ingest.dropped == 1
+    assert ingest.persisted == 0
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app import jobs, study_groups
+from app.jobs import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(async_db):
+    queue = JobQueue(collection=async_db.jobs, workers=0)
+
+    @queue.handler("noop")
+    async def noop(payload):
+        pass
+
+    return queue
+
+
+async def test_expired_lease_is_reclaimed_while_attempts_remain(queue, async_db):
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    job_id = await queue.enqueue("noop", {}, max_attempts=3)
+    await async_db.jobs.update_one({"_id": job_id}, {"$set": {"status": "running", "attempts": 1, "locked_until": past}})
+
+    job = await queue.claim()
+
+    assert job["_id"] == job_id
+    assert job["attempts"] == 2
+
+
+async def test_expired_lease_on_last_attempt_is_failed_not_reclaimed(queue, async_db):
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    job_id = await queue.enqueue("noop", {}, max_attempts=3)
+    await async_db.jobs.update_one({"_id": job_id}, {"$set": {"status": "running", "attempts": 3, "locked_until": past}})
+
+    assert await queue.claim() is None
+    assert await queue.fail_abandoned() == 1
+
+    job = await async_db.jobs.find_one({"_id": job_id})
+    assert job["status"] == "failed"
+    assert job["attempts"] == 3
+    assert "locked_until" not in job
+
+
+async def test_failing_handler_is_retried_then_failed(queue, async_db):
+    @queue.handler("broken")
+    async def broken(payload):
+        raise RuntimeError("boom")
+
+    job_id = await queue.enqueue("broken", {}, max_attempts=2)
+    await queue.run_one(await queue.claim())
+    job = await async_db.jobs.find_one({"_id": job_id})
+    assert job["status"] == "queued"
+
+    await async_db.jobs.update_one({"_id": job_id}, {"$set": {"run_at": datetime.now(timezone.utc)}})
+    await queue.run_one(await queue.claim())
+    job = await async_db.jobs.find_one({"_id": job_id})
+    assert job["status"] == "failed"
+    assert "boom" in job["last_error"]
+
+
+async def test_cleanup_waits_for_the_soft_delete(async_db, monkeypatch):
+    async def no_files(group_id):
+        return 0
+
+    monkeypatch.setattr(study_groups.storage, "delete_group_files", no_files)
+    group_id = (await async_db.study_groups.insert_one({"name": "g", "is_active": True})).inserted_id
+    await async_db.group_members.insert_one({"group_id": str(group_id), "user_id": "u1"})
+
+    with pytest.raises(RuntimeError):
+        await study_groups.cleanup_group({"group_id": str(group_id)})
+    assert await async_db.group_members.count_documents({}) == 1
+
+    await async_db.study_groups.update_one({"_id": group_id}, {"$set": {"is_active": False}})
+    await study_groups.cleanup_group({"group_id": str(group_id)})
+    assert await async_db.group_members.count_documents({}) == 0
+    assert await async_db.study_groups.find_one({"_id": ObjectId(group_id)}) is None
+
+
+async def test_worker_survives_a_failed_result_write(queue, async_db, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.01)
+    real_run_one = queue.run_one
+    runs = []
+
+    async def flaky_run_one(job):
+        runs.append(job["_id"])
+        if len(runs) == 1:
+            raise ConnectionError("primary stepped down")
+        await real_run_one(job)
+
+    monkeypatch.setattr(queue, "run_one", flaky_run_one)
+    first = await queue.enqueue("noop", {})
+    second = await queue.enqueue("noop", {})
+    worker = asyncio.create_task(queue._work())
+    try:
+        for _ in range(100):
+            if queue.completed:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker.cancel()
+
+    assert runs == [first, second]
+    assert (await async_db.jobs.find_one({"_id": second}))["status"] == "done"
+    # The first job is still leased and will be handed back when the lease runs out
+    assert (await async_db.jobs.find_one({"_id": first}))["status"] == "running"
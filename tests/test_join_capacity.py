@@ -0,0 +1,79 @@
+import asyncio
+import random
+
+import pytest
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from app import study_groups
+
+pytestmark = pytest.mark.anyio
+
+
+class YieldingCollection:
+    """Wraps a mongomock collection so every call yields to the event loop first.
+
+    mongomock answers synchronously; the extra yields let concurrent joins
+    interleave between their reads and writes the way network round trips do.
+    """
+
+    def __init__(self, collection, rng):
+        self._collection = collection
+        self._rng = rng
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in ("find_one", "find_one_and_update", "insert_one", "update_one"):
+            return attribute
+
+        async def call(*args, **kwargs):
+            for _ in range(self._rng.randint(0, 3)):
+                await asyncio.sleep(0)
+            return await attribute(*args, **kwargs)
+        return call
+
+
+class YieldingDatabase:
+    def __init__(self, database, rng):
+        self._database = database
+        self._rng = rng
+
+    def __getattr__(self, name):
+        return YieldingCollection(self._database[name], self._rng)
+
+
+@pytest.fixture
+async def capped_group(async_db, monkeypatch):
+    monkeypatch.setattr(study_groups, "async_db", YieldingDatabase(async_db, random.Random(7)))
+    await async_db.group_members.create_index([("group_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+    group_id = ObjectId()
+    await async_db.study_groups.insert_one({
+        "_id": group_id, "name": "g", "creator_id": "creator", "is_private": False,
+        "max_members": 10, "member_count": 1, "is_active": True,
+    })
+    await async_db.group_members.insert_one({"group_id": str(group_id), "user_id": "creator", "role": "creator"})
+    return group_id
+
+
+async def test_concurrent_joins_never_overfill_the_group(async_db, capped_group):
+    # 40 users, each joining twice at once, for 9 free seats
+    attempts = [f"user{i}" for i in range(40)] * 2
+    random.Random(3).shuffle(attempts)
+
+    results = await asyncio.gather(*(study_groups.add_member({"_id": capped_group}, user_id) for user_id in attempts))
+
+    group = await async_db.study_groups.find_one({"_id": capped_group})
+    members = [m["user_id"] async for m in async_db.group_members.find({"group_id": str(capped_group)})]
+    assert group["member_count"] <= group["max_members"]
+    assert len(members) == len(set(members))
+    assert group["member_count"] == len(members)
+    assert sum(1 for joined, _ in results if joined) == len(members) - 1
+
+
+async def test_repeated_join_is_refused_as_already_a_member(async_db, capped_group):
+    results = await asyncio.gather(*(study_groups.add_member({"_id": capped_group}, "user1") for _ in range(5)))
+
+    assert sum(1 for joined, _ in results if joined) == 1
+    assert all(group["is_member"] for joined, group in results if not joined)
+    group = await async_db.study_groups.find_one({"_id": capped_group})
+    assert group["member_count"] == 2
@@ -0,0 +1,29 @@
+import pytest
+from pymongo import ASCENDING
+
+from app.migrations.membership_collection import migrate
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_migration_dedupes_and_replaces_the_old_index(async_db):
+    await async_db.group_members.create_index([("group_id", ASCENDING), ("user_id", ASCENDING)], name="group_user")
+    group_id = (await async_db.study_groups.insert_one({
+        "name": "g", "creator_id": "u1", "members": ["u1", "u2", "u3"], "member_count": 7,
+    })).inserted_id
+    await async_db.group_members.insert_many([
+        {"group_id": str(group_id), "user_id": "u1", "role": "creator"},
+        {"group_id": str(group_id), "user_id": "u2", "role": "member"},
+        {"group_id": str(group_id), "user_id": "u2", "role": "member"},
+    ])
+
+    counts = await migrate(batch_size=100, dry_run=False, keep_array=False)
+
+    assert counts["duplicates_removed"] == 1
+    assert counts["records_backfilled"] == 1
+    indexes = await async_db.group_members.index_information()
+    assert "group_user" not in indexes
+    assert indexes["group_user_unique"]["unique"]
+    group = await async_db.study_groups.find_one({"_id": group_id})
+    assert group["member_count"] == 3
+    assert "members" not in group
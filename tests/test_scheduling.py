@@ -0,0 +1,130 @@
+import pytest
+
+from app.scheduling import allocate, find_conflicts, free_intervals, merge_intervals, parse_time
+
+
+@pytest.mark.parametrize("value, minutes", [("00:00", 0), ("9:05", 545), (" 23:59 ", 1439), ("24:00", 1440)])
+def test_parse_time(value, minutes):
+    assert parse_time(value) == minutes
+
+
+@pytest.mark.parametrize("value", ["10:75", "9:-30", "-1:00", "25:00", "24:30", "10", "ab:cd"])
+def test_parse_time_rejects_bad_input(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_merge_intervals():
+    assert merge_intervals([(5, 7), (1, 3), (2, 4), (7, 8), (10, 11)]) == [(1, 4), (5, 8), (10, 11)]
+    assert merge_intervals([]) == []
+
+
+def test_free_intervals():
+    busy = [(600, 660), (630, 700), (900, 960), (0, 100)]
+    assert free_intervals(busy, 480, 1000) == [(480, 600), (700, 900), (960, 1000)]
+    assert free_intervals([(400, 1200)], 480, 1000) == []
+    assert free_intervals([], 480, 1000) == [(480, 1000)]
+
+
+def block(day, start, end):
+    return {"day": day, "startTime": start, "endTime": end}
+
+
+def test_find_conflicts():
+    blocks = [
+        block(1, "09:00", "10:00"),
+        block(1, "09:30", "11:00"),
+        block(1, "10:00", "10:30"),  # back to back with the first, overlaps the second
+        block(2, "09:00", "10:00"),  # same times, different day
+        block(1, "12:00", "11:00"),  # invalid
+    ]
+
+    conflicts, invalid = find_conflicts(blocks)
+
+    assert conflicts == [(0, 1, 1, 570, 600), (1, 2, 1, 600, 630)]
+    assert invalid == [4]
+
+
+def test_find_conflicts_only_involving():
+    blocks = [block(1, "09:00", "10:00"), block(1, "09:00", "10:00"), block(1, "09:30", "09:45")]
+
+    conflicts, _ = find_conflicts(blocks, only_involving={2})
+
+    assert [(i, j) for i, j, *_ in conflicts] == [(0, 2), (1, 2)]
+
+
+def test_allocate_places_every_session_around_existing_blocks():
+    courses = [
+        {"name": "Algebra", "code": "MTH101", "unit": 2, "difficulty": "hard"},
+        {"name": "Poetry", "code": "ENG101", "unit": 2, "difficulty": "easy"},
+    ]
+    lectures = [block(1, "08:00", "10:00"), block(2, "13:00", "15:00")]
+
+    result = allocate(courses, lectures, days=[1, 2, 3], break_minutes=15)
+
+    sessions = {"MTH101": 0, "ENG101": 0}
+    for placed in result["blocks"]:
+        sessions[placed["course"]] += 1
+    assert sessions == {"MTH101": 4, "ENG101": 2}
+    assert result["unplaced"] == [] and not result["truncated"]
+    # Nothing overlaps the lectures or each other, and breaks are kept
+    conflicts, invalid = find_conflicts(lectures + result["blocks"])
+    assert conflicts == [] and invalid == []
+    for placed in result["blocks"]:
+        for other in lectures + result["blocks"]:
+            if other is placed or other["day"] != placed["day"]:
+                continue
+            gap = max(parse_time(other["startTime"]) - parse_time(placed["endTime"]),
+                      parse_time(placed["startTime"]) - parse_time(other["endTime"]))
+            assert gap >= 15
+    # Sessions of one course are spread over different days while possible
+    algebra_days = [placed["day"] for placed in result["blocks"] if placed["course"] == "MTH101"]
+    assert len(set(algebra_days)) == 3
+
+
+def test_allocate_gives_scarce_time_to_weighted_demand():
+    courses = [
+        {"name": "Poetry", "code": "ENG101", "unit": 3, "difficulty": "easy"},
+        {"name": "Algebra", "code": "MTH101", "unit": 3, "difficulty": "hard"},
+    ]
+
+    # Room for 4 sessions: algebra needs 6 (weight 2), poetry 3 (weight 1)
+    result = allocate(courses, [], days=[1], day_start="08:00", day_end="12:00", break_minutes=0)
+
+    assert [placed["course"] for placed in result["blocks"]] == ["MTH101"] * 4
+    assert {"course": "ENG101", "sessions": 3} in result["unplaced"]
+    assert {"course": "MTH101", "sessions": 2} in result["unplaced"]
+
+
+def test_allocate_interleaves_once_demand_evens_out():
+    courses = [
+        {"name": "Algebra", "code": "MTH101", "unit": 1, "difficulty": "hard"},
+        {"name": "Poetry", "code": "ENG101", "unit": 2, "difficulty": "easy"},
+    ]
+
+    # Weighted demand: algebra 2 * 2 = 4, poetry 1 * 2 = 2
+    result = allocate(courses, [], days=[1], day_end="23:00", break_minutes=0, max_minutes_per_day=600)
+
+    assert [placed["course"] for placed in result["blocks"]] == ["MTH101", "MTH101", "ENG101", "ENG101"]
+
+
+def test_allocate_stops_at_the_time_budget():
+    courses = [{"name": f"C{i}", "code": f"C{i}", "unit": 4, "difficulty": "hard"} for i in range(20)]
+
+    result = allocate(courses, [], time_budget_ms=0)
+
+    assert result["truncated"]
+    assert result["blocks"] == []
+
+
+def test_allocate_caps_study_time_not_class_time():
+    courses = [{"name": "Algebra", "code": "MTH101", "unit": 4, "difficulty": "easy"}]
+    lecture = dict(block(1, "08:00", "11:00"), type="lecture")
+    study = dict(block(1, "08:00", "11:00"), type="study")
+
+    # 4 sessions wanted, 240 study minutes a day on a single day
+    with_lecture = allocate(courses, [lecture], days=[1], break_minutes=0)
+    with_study = allocate(courses, [study], days=[1], break_minutes=0)
+
+    assert len(with_lecture["blocks"]) == 4
+    assert len(with_study["blocks"]) == 1
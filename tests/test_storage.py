@@ -0,0 +1,65 @@
+import base64
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app import study_groups
+from app.schemas import GroupResourceCreate
+from app.storage import parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-2000", (990, 999)),
+    (None, None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=500-100", None),  # first > last: invalid, serve the whole file
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [("bytes=1000-", 1000), ("bytes=1000-1001", 1000), ("bytes=-0", 1000), ("bytes=0-", 0)])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+@pytest.mark.anyio
+async def test_upload_accepts_line_wrapped_base64(async_db, monkeypatch):
+    stored = {}
+
+    async def store_bytes(data, filename, content_type, metadata):
+        stored["data"] = data
+        return {"file_id": ObjectId(), "length": len(data), "sha256": "x"}
+
+    monkeypatch.setattr(study_groups.storage, "store_bytes", store_bytes)
+    content = base64.encodebytes(bytes(range(256)) * 2).decode()  # wrapped at 76 columns
+    assert "\n" in content
+    resource = GroupResourceCreate(
+        name="notes.bin", file_type="application/octet-stream", file_size=512, group_id="g", file_content=content
+    )
+
+    response = await study_groups.upload_group_resource(
+        "g", resource, access={"is_member": True}, user={"_id": "u1", "full_name": "U One"}
+    )
+
+    assert stored["data"] == bytes(range(256)) * 2
+    assert response.file_size == 512
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_invalid_base64(async_db):
+    resource = GroupResourceCreate(
+        name="notes.bin", file_type="application/octet-stream", file_size=3, group_id="g", file_content="not*base64!"
+    )
+
+    with pytest.raises(HTTPException) as error:
+        await study_groups.upload_group_resource("g", resource, access={"is_member": True}, user={"_id": "u1"})
+
+    assert error.value.status_code == 400